@@ -2,6 +2,66 @@
 
 import frappe
 from frappe import _
+from frappe.utils import sbool
+from frappe.utils.background_jobs import get_job
+
+from emails.email_service.email_override import check_resend_status
+from emails.email_service.generic_email import (
+    get_party_email as _get_party_email,
+    resolve_recipient_email,
+    send_document_email as _send_document_email,
+    validate_document_email,
+)
+from emails.email_service.resend_client import send_email, test_connection
+from emails.email_service.utils import (
+    CONFIGURED_DOCTYPES_CACHE_KEY,
+    get_customer_primary_email,
+    get_supplier_primary_email,
+)
+
+# RQ job states mapped to the statuses reported by get_send_status
+_SEND_JOB_STATUS = {
+    "queued": "PENDING",
+    "deferred": "PENDING",
+    "scheduled": "PENDING",
+    "started": "RUNNING",
+    "finished": "SUCCESS",
+    "failed": "FAILURE",
+    "stopped": "FAILURE",
+    "canceled": "FAILURE",
+}
+
+# Most documents send_document_emails_bulk queues in one job, which has to
+# finish within its one hour timeout
+MAX_BULK_DOCNAMES = 1000
+
+# Body and tags of the configuration test email sent by send_test_email
+_TEST_EMAIL_HTML = """
+<div style="font-family: Arial, sans-serif; padding: 20px;">
+    <h2>Test Email</h2>
+    <p>This is a test email from your Emails app integration.</p>
+    <p>If you received this email, your Resend configuration is working correctly!</p>
+    <hr>
+    <p style="color: #666; font-size: 12px;">
+        Sent via Emails App
+    </p>
+</div>
+""".strip()
+
+_TEST_EMAIL_TAGS = [{"name": "type", "value": "test"}]
+
+# Roles allowed to send the configuration test email
+_TEST_EMAIL_ROLES = frozenset({"System Manager"})
+
+
+def _success(**data):
+    """Build the success response returned by the whitelisted methods."""
+    return {"success": True, **data}
+
+
+def _error(message):
+    """Build the failure response returned by the whitelisted methods."""
+    return {"success": False, "message": message}
 
 
 @frappe.whitelist()
@@ -59,40 +119,160 @@ def send_payment_request_email(payment_request_name, to_email=None, cc=None, bcc
 
 
 @frappe.whitelist()
-def send_document_email(doctype, docname, to_email=None, cc=None, bcc=None, custom_message=None):
-    """Generic method to send email for any configured document type."""
+def send_document_email(
+    doctype,
+    docname,
+    to_email=None,
+    cc=None,
+    bcc=None,
+    custom_message=None,
+    sync=False,
+    attach_pdf=None,
+):
+    """
+    Generic method to send email for any configured document type.
+
+    The send is queued as a background job so the request does not wait on the
+    Resend API; the document and recipient are checked before queueing. Track
+    the job with get_send_status. Pass sync=True to send inline and get the send
+    result directly. Pass attach_pdf to override whether the document PDF is attached.
+    """
     try:
         frappe.has_permission(doctype, "email", docname, throw=True)
 
-        settings = frappe.get_single("Email Service Settings")
+        settings = frappe.get_cached_doc("Email Service Settings")
 
         if not settings.is_doctype_supported(doctype):
-            return {
-                "success": False,
-                "message": _("Email sending not configured for {0}").format(doctype),
-            }
-
-        from emails.email_service.generic_email import send_document_email as _send
-
-        return _send(
-            doctype,
-            docname,
+            return _error(_("Email sending not configured for {0}").format(doctype))
+
+        if attach_pdf is not None:
+            attach_pdf = sbool(attach_pdf)
+
+        if sbool(sync):
+            return _send_document_email(
+                doctype,
+                docname,
+                to_email=to_email,
+                cc=cc,
+                bcc=bcc,
+                custom_message=custom_message,
+                attach_pdf=attach_pdf,
+            )
+
+        # Report a document that can never be sent now, not from the job
+        validate_document_email(doctype, docname, to_email)
+
+        job_id = f"emails::{doctype}::{docname}::{frappe.generate_hash(length=8)}"
+        frappe.enqueue(
+            "emails.email_service.generic_email.send_document_email",
+            queue="short",
+            timeout=120,
+            job_id=job_id,
+            enqueue_after_commit=True,
+            doctype=doctype,
+            docname=docname,
             to_email=to_email,
             cc=cc,
             bcc=bcc,
             custom_message=custom_message,
+            attach_pdf=attach_pdf,
+        )
+
+        return _success(
+            queued=True,
+            job_id=job_id,
+            message=_("{0} email queued for sending").format(doctype),
         )
 
     except frappe.PermissionError:
-        return {
-            "success": False,
-            "message": _("You don't have permission to send email for this document"),
-        }
+        return _error(_("You don't have permission to send email for this document"))
+    except frappe.ValidationError as e:
+        # Validation messages (e.g. document not submitted) are for the user
+        return _error(str(e))
     except Exception as e:
         frappe.log_error(
             title=f"Send {doctype} Email API Error", message=frappe.get_traceback()
         )
-        return {"success": False, "message": str(e)}
+        return _error(str(e))
+
+
+@frappe.whitelist()
+def send_document_emails_bulk(doctype, docnames):
+    """
+    Queue emails for many documents of one doctype as a single background job.
+
+    Track the job with get_send_status; its result lists the sent, failed and
+    skipped documents.
+    """
+    try:
+        docnames = frappe.parse_json(docnames)
+        if (
+            not isinstance(docnames, list)
+            or not docnames
+            or not all(isinstance(docname, str) and docname for docname in docnames)
+        ):
+            return _error(_("Document names must be a non-empty list"))
+
+        if len(docnames) > MAX_BULK_DOCNAMES:
+            return _error(
+                _("At most {0} documents can be emailed at once").format(MAX_BULK_DOCNAMES)
+            )
+
+        for docname in docnames:
+            frappe.has_permission(doctype, "email", docname, throw=True)
+
+        settings = frappe.get_cached_doc("Email Service Settings")
+
+        if not settings.is_doctype_supported(doctype):
+            return _error(_("Email sending not configured for {0}").format(doctype))
+
+        job_id = f"emails::{doctype}::bulk::{frappe.generate_hash(length=8)}"
+        frappe.enqueue(
+            "emails.email_service.generic_email.send_document_emails_bulk",
+            queue="long",
+            timeout=60 * 60,
+            job_id=job_id,
+            enqueue_after_commit=True,
+            doctype=doctype,
+            docnames=docnames,
+        )
+
+        return _success(
+            queued=True,
+            job_id=job_id,
+            message=_("{0} {1} emails queued for sending").format(len(docnames), doctype),
+        )
+
+    except frappe.PermissionError:
+        return _error(_("You don't have permission to send email for these documents"))
+    except Exception as e:
+        frappe.log_error(
+            title=f"Send {doctype} Bulk Email API Error", message=frappe.get_traceback()
+        )
+        return _error(str(e))
+
+
+@frappe.whitelist()
+def get_send_status(job_id):
+    """Get the status of a queued document email (PENDING, RUNNING, SUCCESS or FAILURE)."""
+    job = get_job(job_id)
+
+    # Only the user who queued the send can inspect it
+    if not job or job.kwargs.get("user") != frappe.session.user:
+        return {"status": "UNKNOWN"}
+
+    job_status = job.get_status()
+    status = _SEND_JOB_STATUS.get(getattr(job_status, "value", job_status), "PENDING")
+
+    if status == "SUCCESS":
+        return {"status": status, "result": job.result}
+    if status == "FAILURE":
+        return {
+            "status": status,
+            "message": _("Email sending failed. Check Error Log for details."),
+        }
+
+    return {"status": status}
 
 
 @frappe.whitelist()
@@ -101,25 +281,18 @@ def test_resend_connection():
     try:
         frappe.has_permission("Email Service Settings", "read", throw=True)
 
-        from emails.email_service.resend_client import test_connection
-
         return test_connection()
 
     except frappe.PermissionError:
-        return {
-            "success": False,
-            "message": _("You don't have permission to test the connection"),
-        }
+        return _error(_("You don't have permission to test the connection"))
     except Exception as e:
-        return {"success": False, "message": str(e)}
+        return _error(str(e))
 
 
 @frappe.whitelist()
 def get_resend_status():
     """Get current Resend service status and configuration."""
     try:
-        from emails.email_service.email_override import check_resend_status
-
         return check_resend_status()
 
     except Exception as e:
@@ -130,89 +303,65 @@ def get_resend_status():
 def get_customer_email(customer_name):
     """Get primary email for a customer."""
     try:
-        from emails.email_service.utils import get_customer_primary_email
-
         email = get_customer_primary_email(customer_name)
 
         if email:
-            return {"success": True, "email": email}
+            return _success(email=email)
         else:
-            return {
-                "success": False,
-                "message": _("No email found for customer {0}").format(customer_name),
-            }
+            return _error(_("No email found for customer {0}").format(customer_name))
 
     except Exception as e:
-        return {"success": False, "message": str(e)}
+        return _error(str(e))
 
 
 @frappe.whitelist()
 def get_party_email(doctype, party_name):
     """Get primary email for any party type."""
     try:
-        from emails.email_service.generic_email import get_party_email as _get_party_email
-
         email = _get_party_email(doctype, party_name)
 
         if email:
-            return {"success": True, "email": email}
+            return _success(email=email)
         else:
-            return {
-                "success": False,
-                "message": _("No email found for {0} {1}").format(doctype, party_name),
-            }
+            return _error(_("No email found for {0} {1}").format(doctype, party_name))
 
     except Exception as e:
-        return {"success": False, "message": str(e)}
+        return _error(str(e))
 
 
 @frappe.whitelist()
 def send_test_email(to_email):
     """Send a test email to verify Resend configuration."""
     try:
-        if "System Manager" not in frappe.get_roles():
+        if _TEST_EMAIL_ROLES.isdisjoint(frappe.get_roles()):
             frappe.throw(_("Only System Managers can send test emails"))
 
-        from emails.email_service.resend_client import send_email
-
         result = send_email(
             to_email=to_email,
             subject="Test Email from Emails App",
-            html_content="""
-                <div style="font-family: Arial, sans-serif; padding: 20px;">
-                    <h2>Test Email</h2>
-                    <p>This is a test email from your Emails app integration.</p>
-                    <p>If you received this email, your Resend configuration is working correctly!</p>
-                    <hr>
-                    <p style="color: #666; font-size: 12px;">
-                        Sent via Emails App
-                    </p>
-                </div>
-            """,
-            tags=[{"name": "type", "value": "test"}],
+            html_content=_TEST_EMAIL_HTML,
+            tags=_TEST_EMAIL_TAGS,
         )
 
-        return {
-            "success": True,
-            "message": _("Test email sent successfully to {0}").format(to_email),
-            "message_id": result.get("message_id"),
-        }
+        return _success(
+            message=_("Test email sent successfully to {0}").format(to_email),
+            message_id=result.get("message_id"),
+        )
 
     except Exception as e:
         frappe.log_error(title="Test Email Failed", message=str(e))
-        return {"success": False, "message": str(e)}
+        return _error(str(e))
 
 
 @frappe.whitelist()
 def check_doctype_email_enabled(doctype):
     """Check if email sending is enabled for a doctype (Resend enabled AND configured)."""
     try:
-        settings = frappe.get_single("Email Service Settings")
-
-        if not settings.enabled:
-            return {"enabled": False}
+        settings = frappe.get_cached_doc("Email Service Settings")
 
-        if not settings.get_password("resend_api_key"):
+        # Password fields hold a masked placeholder when set, so presence can be
+        # checked on the cached doc without decrypting the key
+        if not settings.enabled or not settings.resend_api_key:
             return {"enabled": False}
 
         # Check if doctype is supported
@@ -228,20 +377,51 @@ def check_doctype_email_enabled(doctype):
         return {"enabled": False}
 
 
+def _resolve_party_recipient(doc):
+    """Legacy recipient lookup via the document's customer or supplier."""
+    if doc.get("customer"):
+        return get_customer_primary_email(doc.customer)
+    if doc.get("supplier"):
+        return get_supplier_primary_email(doc.supplier)
+    return None
+
+
+def _resolve_quotation_recipient(doc):
+    """Legacy recipient lookup for Quotations addressed to a customer or lead."""
+    if doc.quotation_to == "Customer" and doc.party_name:
+        return get_customer_primary_email(doc.party_name)
+    return doc.get("contact_email")
+
+
+def _resolve_payment_request_recipient(doc):
+    """Legacy recipient lookup for Payment Requests."""
+    if doc.get("email_to"):
+        return doc.email_to
+    if doc.party_type == "Customer" and doc.party:
+        return get_customer_primary_email(doc.party)
+    return None
+
+
+# Legacy recipient resolvers for doctypes that don't use customer/supplier
+_RECIPIENT_FALLBACKS = {
+    "Quotation": _resolve_quotation_recipient,
+    "Payment Request": _resolve_payment_request_recipient,
+}
+
+
 @frappe.whitelist()
 def get_document_recipient(doctype, docname):
     """Get default recipient email for a document."""
     try:
-        from emails.email_service.utils import (
-            get_customer_primary_email,
-            get_supplier_primary_email
-        )
-        from emails.email_service.generic_email import resolve_recipient_email
+        settings = frappe.get_cached_doc("Email Service Settings")
+
+        # Nothing to resolve while the email service is switched off
+        if not settings.enabled:
+            return {"email": None}
 
-        doc = frappe.get_doc(doctype, docname)
+        doc = frappe.get_cached_doc(doctype, docname)
 
         # Try using the generic resolver first
-        settings = frappe.get_single("Email Service Settings")
         config = settings.get_doctype_config(doctype)
         email = resolve_recipient_email(doc, config)
 
@@ -249,25 +429,10 @@ def get_document_recipient(doctype, docname):
             return {"email": email}
 
         # Fallback to legacy resolution
-        if hasattr(doc, "customer") and doc.customer:
-            email = get_customer_primary_email(doc.customer)
-        elif doctype == "Quotation":
-            if doc.quotation_to == "Customer" and doc.party_name:
-                email = get_customer_primary_email(doc.party_name)
-            elif hasattr(doc, "contact_email") and doc.contact_email:
-                email = doc.contact_email
-        elif doctype == "Payment Request":
-            if hasattr(doc, "email_to") and doc.email_to:
-                email = doc.email_to
-            elif doc.party_type == "Customer" and doc.party:
-                email = get_customer_primary_email(doc.party)
-        elif hasattr(doc, "supplier") and doc.supplier:
-            email = get_supplier_primary_email(doc.supplier)
-
-        if not email and hasattr(doc, "contact_email") and doc.contact_email:
-            email = doc.contact_email
-
-        return {"email": email} if email else {"email": None}
+        resolver = _RECIPIENT_FALLBACKS.get(doctype, _resolve_party_recipient)
+        email = resolver(doc) or doc.get("contact_email")
+
+        return {"email": email or None}
 
     except Exception as e:
         frappe.log_error(title="Get Document Recipient Error", message=str(e))
@@ -278,31 +443,34 @@ def get_document_recipient(doctype, docname):
 def get_supported_doctypes():
     """Get list of doctypes available for email configuration on this site."""
     try:
-        settings = frappe.get_single("Email Service Settings")
-        return {"success": True, "doctypes": settings.get_available_doctypes()}
+        settings = frappe.get_cached_doc("Email Service Settings")
+        return _success(doctypes=settings.get_available_doctypes())
     except Exception as e:
-        return {"success": False, "message": str(e)}
+        return _error(str(e))
 
 
 @frappe.whitelist()
 def get_configured_doctypes():
     """Get list of doctypes that are currently configured for email."""
     try:
-        settings = frappe.get_single("Email Service Settings")
-        configured = []
-
-        if settings.supported_doctypes:
-            for row in settings.supported_doctypes:
-                configured.append(
-                    {
-                        "doctype": row.doctype_name,
-                        "enabled": row.enabled,
-                        "has_template": bool(row.resend_template_id),
-                        "source_app": row.source_app,
-                    }
-                )
-
-        return {"success": True, "configured": configured}
+        configured = frappe.cache().get_value(
+            CONFIGURED_DOCTYPES_CACHE_KEY, generator=_get_configured_doctypes
+        )
+        return _success(configured=configured)
 
     except Exception as e:
-        return {"success": False, "message": str(e)}
+        return _error(str(e))
+
+
+def _get_configured_doctypes():
+    """Summarise the configured doctype rows (cached until settings are saved)."""
+    settings = frappe.get_cached_doc("Email Service Settings")
+    return [
+        {
+            "doctype": row.doctype_name,
+            "enabled": row.enabled,
+            "has_template": bool(row.resend_template_id),
+            "source_app": row.source_app,
+        }
+        for row in settings.supported_doctypes or []
+    ]
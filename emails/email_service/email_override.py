@@ -11,28 +11,76 @@ import frappe
 from frappe import _
 from frappe.core.doctype.communication import email as frappe_email
 
-from emails.email_service.utils import should_use_resend, get_email_settings
+from emails.email_service.utils import (
+    RESEND_STATUS_CACHE_KEY,
+    bulk_create_communications,
+    is_doctype_configured,
+    should_use_resend,
+    log_send_error,
+)
+from emails.email_service.generic_email import validate_document_email
 from emails.email_service.resend_client import ResendError
 
+# Send handlers from the resend_email_handlers hook, resolved once per site
+_HANDLER_REGISTRY = {}
+
+# Seconds a queued Resend send may run before RQ stops it (PDF rendering
+# included); the Communication is then marked as Error
+_SEND_JOB_TIMEOUT = 300
+
+# Legacy template ID fields reported by check_resend_status
+_LEGACY_TEMPLATE_FIELDS = (
+    ("Sales Invoice", "invoice_template_id"),
+    ("Quotation", "quotation_template_id"),
+    ("Sales Order", "sales_order_template_id"),
+    ("Payment Request", "payment_request_template_id"),
+)
+
+
+def _resolve_handler(path):
+    """Import a handler path, returning None (logged once) if it can't be loaded."""
+    try:
+        return frappe.get_attr(path)
+    except (ImportError, AttributeError):
+        frappe.log_error(title="Resend Email Handler Not Found", message=frappe.get_traceback())
+        return None
+
+
+def _get_handler_registry():
+    """
+    Resolve the resend_email_handlers hook paths to callables on first use.
+
+    Handlers that fail to import are kept as None so the import isn't retried
+    on every send.
+    """
+    registry = _HANDLER_REGISTRY.get(frappe.local.site)
+    if registry is None:
+        registry = {
+            key: _resolve_handler(paths[-1])
+            for key, paths in frappe.get_hooks("resend_email_handlers", {}).items()
+        }
+        _HANDLER_REGISTRY[frappe.local.site] = registry
+
+    return registry
+
 
 def get_email_handler(doctype):
     """
     Get the email handler for a doctype.
 
-    For all configured doctypes, uses the generic email handler.
+    Configured doctypes use the handler registered for them in the
+    resend_email_handlers hook, or the default (generic) handler.
 
     Args:
         doctype: The document type
 
     Returns:
-        str: Handler path or None
+        callable: Handler function or None
     """
     try:
-        settings = frappe.get_single("Email Service Settings")
-
-        if settings.is_doctype_supported(doctype):
-            # Use generic handler for all configured doctypes
-            return "emails.email_service.generic_email.send_document_email"
+        if is_doctype_configured(doctype):
+            registry = _get_handler_registry()
+            return registry.get(doctype) or registry.get("__default__")
 
     except Exception:
         pass
@@ -69,122 +117,70 @@ def make_communication_email(
     Intercepts email sending to route through Resend for configured doctypes,
     preventing ERPNext from sending duplicate emails.
     """
-    # Check if this should be handled by Resend
+    # Check if this should be handled by Resend. The argument checks come first
+    # so emails that can't go through Resend never touch the settings.
     if (
         send_email
         and sent_or_received == "Sent"
         and communication_medium == "Email"
         and doctype
         and name
+        and recipients
         and should_use_resend(doctype)
     ):
-        handler_path = get_email_handler(doctype)
-
-        if handler_path and recipients:
-            try:
-                handler = frappe.get_attr(handler_path)
-
-                # Send via Resend using generic handler
-                result = handler(
-                    doctype,
-                    name,
-                    to_email=recipients,
-                    cc=cc,
-                    bcc=bcc,
-                    custom_message=content,
-                    skip_communication=True,  # We'll create it below
-                )
-
-                if result.get("success"):
-                    # Create Communication directly - bypass frappe_email.make entirely
-                    # to avoid email account validation
-                    settings = get_email_settings()
-
-                    comm = frappe.get_doc(
-                        {
-                            "doctype": "Communication",
-                            "communication_type": communication_type or "Communication",
-                            "communication_medium": "Email",
-                            "sent_or_received": "Sent",
-                            "subject": subject or f"Email for {doctype} {name}",
-                            "content": content or "",
-                            "sender": sender or settings.default_sender_email,
-                            "sender_full_name": sender_full_name
-                            or settings.default_sender_name,
-                            "recipients": recipients,
-                            "cc": cc,
-                            "bcc": bcc,
-                            "reference_doctype": doctype,
-                            "reference_name": name,
-                            "message_id": result.get("message_id"),
-                            "email_status": "Open",
-                            "delivery_status": "Sent",
-                            "status": "Linked",
-                        }
-                    )
-                    comm.insert(ignore_permissions=True)
-                    frappe.db.commit()
-
-                    frappe.msgprint(
-                        _("Email sent successfully via Resend"),
-                        indicator="green",
-                        alert=True,
+        if get_email_handler(doctype):
+            # A document that can never be sent (not submitted, no valid
+            # recipient) is reported now instead of failing in the job
+            validate_document_email(doctype, name, recipients)
+
+            settings = frappe.get_cached_doc("Email Service Settings")
+
+            # Create Communication directly - bypass frappe_email.make entirely
+            # to avoid email account validation. The row is fully built here, so
+            # it is written without the Communication controller. The Resend
+            # call runs in a background job once this request commits, so the
+            # user doesn't wait on it; the job records the outcome on this row.
+            (comm_name,) = bulk_create_communications(
+                [
+                    _build_communication(
+                        settings,
+                        doctype=doctype,
+                        name=name,
+                        content=content,
+                        subject=subject,
+                        sender=sender,
+                        sender_full_name=sender_full_name,
+                        recipients=recipients,
+                        cc=cc,
+                        bcc=bcc,
+                        communication_type=communication_type,
                     )
-
-                    return comm
-
-            except ResendError as e:
-                frappe.log_error(
-                    title="Resend Email Failed",
-                    message=f"DocType: {doctype}\nDocument: {name}\nError: {str(e)}",
-                )
-
-                # Check if we should fallback to ERPNext
-                try:
-                    settings = frappe.get_single("Email Service Settings")
-                    if settings.fallback_to_erpnext:
-                        frappe.msgprint(
-                            _("Resend failed, falling back to ERPNext email"),
-                            indicator="orange",
-                            alert=True,
-                        )
-                        # Fall through to original make below
-                    else:
-                        frappe.throw(_("Email sending failed: {0}").format(str(e)))
-                except Exception:
-                    frappe.throw(_("Email sending failed: {0}").format(str(e)))
-
-                # Only reaches here if fallback is enabled
-                return frappe_email.make(
-                    doctype=doctype,
-                    name=name,
-                    content=content,
-                    subject=subject,
-                    sent_or_received=sent_or_received,
-                    sender=sender,
-                    sender_full_name=sender_full_name,
-                    recipients=recipients,
-                    communication_medium=communication_medium,
-                    send_email=send_email,
-                    print_html=print_html,
-                    print_format=print_format,
-                    attachments=attachments,
-                    send_me_a_copy=send_me_a_copy,
-                    cc=cc,
-                    bcc=bcc,
-                    read_receipt=read_receipt,
-                    print_letterhead=print_letterhead,
-                    email_template=email_template,
-                    communication_type=communication_type,
-                )
-
-            except Exception as e:
-                frappe.log_error(
-                    title="Email Override Error", message=frappe.get_traceback()
-                )
-                frappe.throw(_("Email sending failed. Check Error Log for details."))
-
-    # For non-Resend cases or fallback, call the original function
+                ]
+            )
+
+            frappe.enqueue(
+                "emails.email_service.email_override._send_via_resend_async",
+                queue="short",
+                timeout=_SEND_JOB_TIMEOUT,
+                enqueue_after_commit=True,
+                communication=comm_name,
+                doctype=doctype,
+                docname=name,
+                recipients=recipients,
+                cc=cc,
+                bcc=bcc,
+                content=content,
+            )
+
+            frappe.msgprint(
+                _("Email queued for sending via Resend"),
+                indicator="green",
+                alert=True,
+            )
+
+            return {"name": comm_name, "queued": True}
+
+    # For non-Resend cases, call the original function
     return frappe_email.make(
         doctype=doctype,
         name=name,
@@ -209,9 +205,126 @@ def make_communication_email(
     )
 
 
-def on_communication_update(doc, method):
-    """Hook called when Communication document is updated."""
-    pass
+def _build_communication(
+    settings,
+    doctype,
+    name,
+    content=None,
+    subject=None,
+    sender=None,
+    sender_full_name=None,
+    recipients=None,
+    cc=None,
+    bcc=None,
+    communication_type=None,
+):
+    """Build the Communication row for an email queued through Resend."""
+    return {
+        "communication_type": communication_type or "Communication",
+        "communication_medium": "Email",
+        "sent_or_received": "Sent",
+        "subject": subject or f"Email for {doctype} {name}",
+        "content": content or "",
+        "sender": sender or settings.default_sender_email,
+        "sender_full_name": sender_full_name or settings.default_sender_name,
+        "recipients": recipients,
+        "cc": cc,
+        "bcc": bcc,
+        "reference_doctype": doctype,
+        "reference_name": name,
+        "email_status": "Open",
+        "delivery_status": "Sending",
+        "status": "Linked",
+    }
+
+
+def _send_via_resend_async(
+    communication, doctype, docname, recipients, cc=None, bcc=None, content=None
+):
+    """
+    Send a queued Communication through Resend and record the outcome on it.
+
+    Whatever stops the job (a crash, the job timeout, a worker shutdown), the
+    Communication is left at Error rather than at Sending.
+
+    Returns:
+        bool: Whether the email was sent
+    """
+    try:
+        return _send_and_record(
+            communication, doctype, docname, recipients, cc=cc, bcc=bcc, content=content
+        )
+    except BaseException:
+        # The job's transaction is rolled back on the way out, so the status is
+        # written and committed on its own
+        frappe.db.rollback()
+        frappe.db.set_value(
+            "Communication", communication, "delivery_status", "Error", update_modified=False
+        )
+        frappe.db.commit()
+        raise
+
+
+def _send_and_record(
+    communication, doctype, docname, recipients, cc=None, bcc=None, content=None
+):
+    """Send a queued Communication and record the outcome, see _send_via_resend_async."""
+    handler = get_email_handler(doctype)
+    result = None
+    error = None
+
+    # Expected failures (not configured, Resend rejected the email, document
+    # failed validation) are logged with their message only; a traceback is
+    # kept for unexpected errors.
+    try:
+        if not handler:
+            raise frappe.ValidationError(f"Email sending not configured for {doctype}")
+
+        # Fallback to ERPNext (when enabled) is handled inside the handler
+        result = handler(
+            doctype,
+            docname,
+            to_email=recipients,
+            cc=cc,
+            bcc=bcc,
+            custom_message=content,
+            skip_communication=True,  # Logged by make_communication_email
+        )
+
+    except (ResendError, frappe.ValidationError) as e:
+        error = str(e)
+        log_send_error(
+            title="Resend Email Failed",
+            message=f"DocType: {doctype}\nDocument: {docname}\nError: {error}",
+        )
+
+    except Exception:
+        error = _("Unexpected error, see Error Log for details")
+        log_send_error(title="Email Override Error", message=frappe.get_traceback())
+
+    sent = bool(result and result.get("success"))
+    if sent:
+        values = {"delivery_status": "Sent", "message_id": result.get("message_id")}
+    else:
+        values = {"delivery_status": "Error"}
+        _notify_send_failed(doctype, docname, error)
+
+    frappe.db.set_value("Communication", communication, values, update_modified=False)
+    return sent
+
+
+def _notify_send_failed(doctype, docname, error=None):
+    """Tell the user who queued an email that it couldn't be sent."""
+    message = _("Email for {0} {1} could not be sent via Resend.").format(doctype, docname)
+    if error:
+        message += "<br>" + frappe.utils.escape_html(error)
+
+    frappe.publish_realtime(
+        "msgprint",
+        {"message": message, "title": _("Email Failed"), "indicator": "red"},
+        user=frappe.session.user,
+        after_commit=True,
+    )
 
 
 def get_resend_email_action(doctype, docname):
@@ -227,40 +340,46 @@ def get_resend_email_action(doctype, docname):
 
 
 def check_resend_status():
-    """Check if Resend service is properly configured and enabled."""
+    """
+    Check if Resend service is properly configured and enabled.
+
+    The result is cached for a minute and cleared when Email Service Settings
+    is saved, since the desk asks for it on every load of a configured doctype.
+    """
+    status = frappe.cache().get_value(RESEND_STATUS_CACHE_KEY, expires=True)
+    if status is None:
+        status = _get_resend_status()
+        if "error" not in status:
+            frappe.cache().set_value(RESEND_STATUS_CACHE_KEY, status, expires_in_sec=60)
+
+    return status
+
+
+def _get_resend_status():
+    """Build the Resend status reported by check_resend_status."""
     try:
-        settings = frappe.get_single("Email Service Settings")
+        settings = frappe.get_cached_doc("Email Service Settings")
 
         # Build templates configured dict from child table
+        configured_doctypes = []
         templates_configured = {}
-        if settings.supported_doctypes:
-            for row in settings.supported_doctypes:
-                if row.enabled:
-                    templates_configured[row.doctype_name] = bool(row.resend_template_id)
-
-        # Also check legacy fields for backward compatibility
-        legacy_templates = {
-            "Sales Invoice": bool(getattr(settings, "invoice_template_id", None)),
-            "Quotation": bool(settings.quotation_template_id),
-            "Sales Order": bool(settings.sales_order_template_id),
-            "Payment Request": bool(getattr(settings, "payment_request_template_id", None)),
-        }
+        for row in settings.supported_doctypes or []:
+            if row.enabled:
+                configured_doctypes.append(row.doctype_name)
+                templates_configured[row.doctype_name] = bool(row.resend_template_id)
 
-        # Merge, preferring child table config
-        for doctype, has_template in legacy_templates.items():
+        # Merge legacy fields for backward compatibility, preferring child table config
+        for doctype, fieldname in _LEGACY_TEMPLATE_FIELDS:
             if doctype not in templates_configured:
-                templates_configured[doctype] = has_template
+                templates_configured[doctype] = bool(settings.get(fieldname))
 
         return {
             "enabled": settings.enabled,
-            "configured": bool(settings.get_password("resend_api_key")),
+            # Set password fields hold a masked value, so no need to decrypt
+            "configured": bool(settings.resend_api_key),
             "sender_email": settings.default_sender_email,
             "templates_configured": templates_configured,
-            "configured_doctypes": [
-                row.doctype_name
-                for row in (settings.supported_doctypes or [])
-                if row.enabled
-            ],
+            "configured_doctypes": configured_doctypes,
         }
     except Exception as e:
         return {"enabled": False, "error": str(e)}
@@ -9,23 +9,97 @@ doctype configured in Email Service Settings. It dynamically resolves recipients
 builds template data from document fields, and handles PDF generation.
 """
 
+from functools import lru_cache
+
 import frappe
 from frappe import _
+from jinja2 import Environment
 from frappe.utils import formatdate, fmt_money, get_url
-
-from emails.email_service.resend_client import send_template_email, ResendError
+from frappe.utils.caching import request_cache
+
+from emails.email_service.resend_client import (
+    RESEND_BATCH_SIZE,
+    ResendError,
+    clean_email_list,
+    send_template_email,
+    send_template_emails_batch,
+)
 from emails.email_service.utils import (
+    bulk_send_failing,
     get_email_settings,
     get_company_info,
     get_customer_primary_email,
     get_supplier_primary_email,
-    get_document_pdf,
-    pdf_to_base64,
+    get_document_pdf_attachment,
     create_communication_log,
-    get_document_link,
-    get_email_recipients_from_doc,
+    get_common_template_data,
+    iter_email_recipients_from_doc,
+    get_email_tags,
+    get_generic_party_email,
+    log_send_error,
+    log_sent_communication,
+)
+
+# Field types whose values build_template_data copies into the template data
+_TEMPLATE_FIELDTYPES = frozenset(
+    {
+        "Data",
+        "Link",
+        "Select",
+        "Int",
+        "Float",
+        "Currency",
+        "Date",
+        "Datetime",
+        "Small Text",
+        "Text",
+        "Long Text",
+    }
 )
 
+_DATE_FIELDTYPES = frozenset({"Date", "Datetime"})
+
+# Fields checked, in order, for the document date, total and party name
+_DATE_FIELDS = (
+    "posting_date",
+    "transaction_date",
+    "application_date",
+    "repayment_date",
+    "creation",
+)
+
+_AMOUNT_FIELDS = (
+    "grand_total",
+    "total",
+    "loan_amount",
+    "total_payment",
+    "outstanding_amount",
+    "paid_amount",
+    "total_amount",
+)
+
+_PARTY_NAME_FIELDS = (
+    "customer_name",
+    "party_name",
+    "applicant_name",
+    "borrower_name",
+    "supplier_name",
+    "title",
+)
+
+# Shared environment for subject templates, compiled once per source string
+_subject_env = Environment(auto_reload=False)
+
+# HTML body templates are autoescaped, since they carry document/party values
+_html_env = Environment(auto_reload=False, autoescape=True)
+
+_FALLBACK_MESSAGE = """
+<p>Dear {{ customer_name }},</p>
+<p>Please find attached your {{ document_type }}.</p>
+<p>Total Amount: {{ total_amount }}</p>
+<p>Best regards,<br>{{ company_name }}</p>
+"""
+
 
 def send_document_email(
     doctype,
@@ -35,6 +109,7 @@ def send_document_email(
     bcc=None,
     custom_message=None,
     skip_communication=False,
+    attach_pdf=None,
 ):
     """
     Generic email sender that works with any configured doctype.
@@ -47,11 +122,53 @@ def send_document_email(
         bcc: BCC recipients (optional)
         custom_message: Custom message to include (optional)
         skip_communication: Skip creating Communication log (optional)
+        attach_pdf: Attach the document PDF, overriding the configuration (optional)
 
     Returns:
         dict: Result with success status, message_id, and recipient
     """
     settings = get_email_settings()
+    doc, email = _prepare_document_email(
+        settings,
+        doctype,
+        docname,
+        to_email,
+        cc=cc,
+        bcc=bcc,
+        custom_message=custom_message,
+        attach_pdf=attach_pdf,
+    )
+
+    # Send email
+    try:
+        result = send_template_email(**email)
+    except ResendError as e:
+        return _handle_send_failure(settings, doc, email, e, skip_communication)
+
+    return _handle_sent(doc, email, result.get("message_id"), skip_communication)
+
+
+def validate_document_email(doctype, docname, to_email=None):
+    """
+    Check that a document email can be sent, without building or sending it.
+
+    Lets callers that queue the send report a document that can never be sent
+    (not submitted, no recipient) right away.
+
+    Raises:
+        frappe.ValidationError: If the email can't be sent
+    """
+    _load_document_for_email(get_email_settings(), doctype, docname, to_email)
+
+
+def _load_document_for_email(settings, doctype, docname, to_email=None):
+    """
+    Load a document and check it can be emailed.
+
+    Returns:
+        tuple: The document, its doctype configuration (or None) and the
+            recipient email
+    """
     config = settings.get_doctype_config(doctype)
 
     # Get the document
@@ -79,6 +196,34 @@ def send_document_email(
             _("No email address found for {0} {1}").format(doctype, docname)
         )
 
+    # Checked here rather than left to the payload builder, so in a bulk send
+    # a bad address fails its own document, not the whole batch call
+    if not clean_email_list(to_email):
+        frappe.throw(
+            _("No valid email address found for {0} {1}").format(doctype, docname)
+        )
+
+    return doc, config, to_email
+
+
+def _prepare_document_email(
+    settings,
+    doctype,
+    docname,
+    to_email=None,
+    cc=None,
+    bcc=None,
+    custom_message=None,
+    attach_pdf=None,
+):
+    """
+    Load a document and build the send_template_email arguments for it.
+
+    Returns:
+        tuple: The document and a dict of send_template_email arguments
+    """
+    doc, config, to_email = _load_document_for_email(settings, doctype, docname, to_email)
+
     # Get company info
     company_name = getattr(doc, "company", None) or frappe.defaults.get_global_default(
         "company"
@@ -97,60 +242,191 @@ def send_document_email(
         subject = render_subject_template(config.subject_template, doc, company_info)
         template_data["subject"] = subject
 
-    # Generate PDF attachment
-    print_format = config.print_format if config else None
-    attachments = generate_pdf_attachment(doctype, docname, print_format)
+    # Generate PDF attachment, unless the caller or configuration turns it off
+    attachments = None
+    if settings.should_attach_pdf(doctype, attach_pdf):
+        print_format = config.print_format if config else None
+        attachments = generate_pdf_attachment(doctype, docname, print_format, settings)
+
+    return doc, {
+        "template_id": template_id,
+        "to_email": to_email,
+        "template_data": template_data,
+        "subject": subject,
+        "cc": cc,
+        "bcc": bcc,
+        "attachments": attachments,
+        "tags": get_email_tags(doctype, docname),
+    }
 
-    # Send email
-    try:
-        result = send_template_email(
-            template_id=template_id,
-            to_email=to_email,
-            template_data=template_data,
-            subject=subject,
-            cc=cc,
-            bcc=bcc,
-            attachments=attachments,
-            tags=[
-                {"name": "doctype", "value": frappe.scrub(doctype)},
-                {"name": "document", "value": docname.replace("-", "_").replace(" ", "_")},
-            ],
+
+def _handle_sent(doc, email, message_id, skip_communication=False):
+    """Log a document email Resend accepted and build the send result."""
+    if not skip_communication:
+        log_sent_communication(
+            doctype=doc.doctype,
+            docname=doc.name,
+            recipient=email["to_email"],
+            subject=email["subject"],
+            content=_("{0} email sent via Resend").format(doc.doctype),
+            status="Sent",
+            message_id=message_id,
         )
 
-        if not skip_communication:
-            create_communication_log(
-                doctype=doctype,
-                docname=docname,
-                recipient=to_email,
-                subject=subject,
-                content=_("{0} email sent via Resend").format(doctype),
-                status="Sent",
-                message_id=result.get("message_id"),
-            )
+    return {
+        "success": True,
+        "message": _("{0} email sent successfully").format(doc.doctype),
+        "message_id": message_id,
+        "recipient": email["to_email"],
+    }
 
-        return {
-            "success": True,
-            "message": _("{0} email sent successfully").format(doctype),
-            "message_id": result.get("message_id"),
-            "recipient": to_email,
-        }
 
-    except ResendError as e:
-        if not skip_communication:
-            create_communication_log(
-                doctype=doctype,
-                docname=docname,
-                recipient=to_email,
-                subject=subject,
-                content=_("{0} email failed").format(doctype),
-                status="Error",
-                error_msg=str(e),
-            )
+def _handle_send_failure(settings, doc, email, error, skip_communication=False):
+    """
+    Log a document email Resend refused, then send it through ERPNext when
+    fallback is enabled or re-raise the error.
+    """
+    if not skip_communication:
+        create_communication_log(
+            doctype=doc.doctype,
+            docname=doc.name,
+            recipient=email["to_email"],
+            subject=email["subject"],
+            content=_("{0} email failed").format(doc.doctype),
+            status="Error",
+            error_msg=str(error),
+        )
 
-        if settings.fallback_to_erpnext:
-            return send_fallback_email(doc, doctype, docname, to_email, template_data)
+    if settings.fallback_to_erpnext:
+        return send_fallback_email(
+            doc, doc.doctype, doc.name, email["to_email"], email["template_data"]
+        )
 
-        raise
+    raise error
+
+
+def send_document_emails_bulk(doctype, docnames):
+    """
+    Send emails for many documents of one doctype in a single run.
+
+    Meant to run as one background job rather than a job per document. Emails
+    without attachments go out RESEND_BATCH_SIZE per Resend API call; emails
+    with a PDF are sent one at a time, as Resend's batch endpoint can't carry
+    attachments. Once more than a third of the emails handed to Resend have
+    failed (after at least BULK_ABORT_MIN_ATTEMPTS), the rest are skipped.
+
+    Args:
+        doctype: The document type
+        docnames: List of document names
+
+    Returns:
+        dict: Names of the sent, failed and skipped documents
+    """
+    settings = get_email_settings()
+    sent, failed, skipped = [], [], []
+    # Emails handed to Resend and those it failed, for the early abort
+    attempts = send_failures = 0
+
+    for start in range(0, len(docnames), RESEND_BATCH_SIZE):
+        batch = []
+        for idx in range(start, min(start + RESEND_BATCH_SIZE, len(docnames))):
+            docname = docnames[idx]
+            try:
+                doc, email = _prepare_document_email(settings, doctype, docname)
+            except frappe.ValidationError as e:
+                _log_bulk_failure(doctype, docname, str(e))
+                failed.append(docname)
+                continue
+            except Exception:
+                _log_bulk_failure(doctype, docname, frappe.get_traceback())
+                failed.append(docname)
+                continue
+
+            if not email["attachments"]:
+                batch.append((doc, email))
+                continue
+
+            attempts += 1
+            try:
+                result = send_template_email(**email)
+            except ResendError as e:
+                send_failures += 1
+                if _sent_via_fallback(settings, doc, email, e):
+                    sent.append(docname)
+                else:
+                    failed.append(docname)
+            else:
+                _bulk_sent(doc, email, result.get("message_id"))
+                sent.append(docname)
+
+            if bulk_send_failing(send_failures, attempts):
+                skipped = docnames[idx + 1 :]
+                break
+
+        if batch:
+            attempts += len(batch)
+            try:
+                message_ids = send_template_emails_batch([email for _doc, email in batch])
+            except ResendError as e:
+                send_failures += len(batch)
+                for doc, email in batch:
+                    if _sent_via_fallback(settings, doc, email, e):
+                        sent.append(doc.name)
+                    else:
+                        failed.append(doc.name)
+            else:
+                for (doc, email), message_id in zip(batch, message_ids):
+                    _bulk_sent(doc, email, message_id)
+                    sent.append(doc.name)
+
+        # Keep the Communication logs of emails already sent even if the job
+        # is killed part way through
+        frappe.db.commit()
+
+        if skipped:
+            break
+
+        if bulk_send_failing(send_failures, attempts):
+            skipped = docnames[start + RESEND_BATCH_SIZE :]
+            break
+
+    return {"sent": sent, "failed": failed, "skipped": skipped}
+
+
+def _bulk_sent(doc, email, message_id):
+    """
+    Log an email Resend accepted during a bulk send.
+
+    The email is already out, so a failure to log it is recorded without
+    stopping the run or moving the document out of the sent list.
+    """
+    try:
+        _handle_sent(doc, email, message_id)
+    except Exception:
+        _log_bulk_failure(doc.doctype, doc.name, frappe.get_traceback())
+
+
+def _sent_via_fallback(settings, doc, email, error):
+    """
+    Handle a Resend failure during a bulk send.
+
+    Returns:
+        bool: Whether the email still went out through the ERPNext fallback
+    """
+    try:
+        _handle_send_failure(settings, doc, email, error)
+        return True
+    except Exception as e:
+        _log_bulk_failure(doc.doctype, doc.name, str(e))
+        return False
+
+
+def _log_bulk_failure(doctype, docname, error):
+    """Log a document that failed to send during a bulk send."""
+    log_send_error(
+        title=_("{0} Bulk Email Failed").format(doctype),
+        message=f"Document: {docname}\nError: {error}",
+    )
 
 
 def resolve_recipient_email(doc, config):
@@ -164,30 +440,47 @@ def resolve_recipient_email(doc, config):
     Returns:
         str: Email address or None
     """
-    # Try direct email field path first (if configured)
-    if config and config.email_field_path:
-        email = resolve_field_path(doc, config.email_field_path)
+    for resolver in _RECIPIENT_RESOLVERS:
+        email = resolver(doc, config)
         if email:
             return email
 
-    # Try recipient field + doctype lookup
-    if config and config.recipient_field:
-        party_name = getattr(doc, config.recipient_field, None)
-        if party_name:
-            recipient_doctype = config.recipient_doctype
+    return None
 
-            # Handle Payment Entry special case where party_type is dynamic
-            if not recipient_doctype and hasattr(doc, "party_type"):
-                recipient_doctype = doc.party_type
 
-            if recipient_doctype and party_name:
-                email = get_party_email(recipient_doctype, party_name)
-                if email:
-                    return email
+def _resolve_by_field_path(doc, config):
+    """Resolve the recipient from the configured direct email field path."""
+    if config and config.email_field_path:
+        return resolve_field_path(doc, config.email_field_path)
+    return None
 
-    # Fallback to legacy email resolution
-    recipients = get_email_recipients_from_doc(doc)
-    return recipients[0] if recipients else None
+
+def _resolve_by_recipient_field(doc, config):
+    """Resolve the recipient from the configured party link field."""
+    if not (config and config.recipient_field):
+        return None
+
+    party_name = getattr(doc, config.recipient_field, None)
+
+    # Handle Payment Entry special case where party_type is dynamic
+    recipient_doctype = config.recipient_doctype or getattr(doc, "party_type", None)
+
+    if recipient_doctype and party_name:
+        return get_party_email(recipient_doctype, party_name)
+    return None
+
+
+def _resolve_legacy(doc, config):
+    """Fallback to legacy email resolution from the document's own fields."""
+    return next(iter_email_recipients_from_doc(doc), None)
+
+
+# Recipient resolution strategies, tried in order by resolve_recipient_email
+_RECIPIENT_RESOLVERS = (
+    _resolve_by_field_path,
+    _resolve_by_recipient_field,
+    _resolve_legacy,
+)
 
 
 def resolve_field_path(doc, field_path):
@@ -224,7 +517,8 @@ def resolve_field_path(doc, field_path):
         field_meta = meta.get_field(linked_field)
         if field_meta and field_meta.fieldtype == "Link":
             linked_doctype = field_meta.options
-            linked_doc = frappe.get_doc(linked_doctype, linked_name)
+            # Only read from, so the document cache is safe to use
+            linked_doc = frappe.get_cached_doc(linked_doctype, linked_name)
             return resolve_field_path(linked_doc, remaining_path)
     except Exception:
         pass
@@ -232,6 +526,7 @@ def resolve_field_path(doc, field_path):
     return None
 
 
+@request_cache
 def get_party_email(doctype, party_name):
     """
     Get email for a party (Customer, Supplier, or any other doctype).
@@ -252,49 +547,26 @@ def get_party_email(doctype, party_name):
         return get_generic_party_email(doctype, party_name)
 
 
-def get_generic_party_email(doctype, party_name):
+@request_cache
+def _get_template_fields(doctype, template_fields=None):
     """
-    Get email for any party type by checking common email fields and Contact links.
+    Get (fieldname, fieldtype) of the fields copied into template data.
 
-    Args:
-        doctype: The party doctype
-        party_name: The party name
-
-    Returns:
-        str: Email address or None
+    Limited to the comma-separated template_fields when the doctype's
+    configuration lists them, otherwise every field of a supported type.
     """
-    try:
-        party = frappe.get_doc(doctype, party_name)
-
-        # Try common email field names
-        for field in ["email_id", "email", "contact_email", "primary_email", "email_address"]:
-            email = getattr(party, field, None)
-            if email:
-                return email
-
-        # Try to find via Contact link
-        contact_name = frappe.db.get_value(
-            "Dynamic Link",
-            {"link_doctype": doctype, "link_name": party_name, "parenttype": "Contact"},
-            "parent",
-        )
-
-        if contact_name:
-            contact = frappe.get_doc("Contact", contact_name)
-            if contact.email_id:
-                return contact.email_id
-
-            # Check email_ids child table
-            if contact.email_ids:
-                for email_row in contact.email_ids:
-                    if email_row.is_primary:
-                        return email_row.email_id
-                return contact.email_ids[0].email_id
+    meta = frappe.get_meta(doctype)
 
-    except Exception:
-        pass
+    if template_fields:
+        fields = (meta.get_field(name.strip()) for name in template_fields.split(","))
+    else:
+        fields = meta.fields
 
-    return None
+    return tuple(
+        (field.fieldname, field.fieldtype)
+        for field in fields
+        if field and field.fieldtype in _TEMPLATE_FIELDTYPES
+    )
 
 
 def build_template_data(doc, doctype, company_info, config, custom_message=None):
@@ -321,13 +593,7 @@ def build_template_data(doc, doctype, company_info, config, custom_message=None)
         "document_type": doctype,
         "document_number": doc.name,
         "document_name": doc.name,
-        "company_name": company_info.get("company_name", ""),
-        "company_logo": company_info.get("company_logo", ""),
-        "company_address": company_info.get("company_address", ""),
-        "company_phone": company_info.get("phone", ""),
-        "company_email": company_info.get("email", ""),
-        "document_link": get_document_link(doctype, doc.name),
-        "custom_message": custom_message or "",
+        **get_common_template_data(doctype, doc.name, company_info, custom_message),
         "currency": currency,
     }
 
@@ -347,30 +613,22 @@ def build_template_data(doc, doctype, company_info, config, custom_message=None)
     )
 
     # Include all standard document fields for template flexibility
-    meta = frappe.get_meta(doctype)
-    for field in meta.fields:
-        field_value = getattr(doc, field.fieldname, None)
-        if field_value is not None and field.fieldtype in [
-            "Data",
-            "Link",
-            "Select",
-            "Int",
-            "Float",
-            "Currency",
-            "Date",
-            "Datetime",
-            "Small Text",
-            "Text",
-            "Long Text",
-        ]:
-            # Format dates
-            if field.fieldtype in ["Date", "Datetime"] and field_value:
-                data[field.fieldname] = formatdate(field_value)
-            # Format currency
-            elif field.fieldtype == "Currency" and field_value:
-                data[field.fieldname] = fmt_money(field_value, currency=currency)
-            else:
-                data[field.fieldname] = str(field_value) if field_value else ""
+    template_fields = config.template_fields if config else None
+    for fieldname, fieldtype in _get_template_fields(doctype, template_fields):
+        field_value = getattr(doc, fieldname, None)
+        if field_value is None:
+            continue
+
+        if not field_value:
+            data[fieldname] = ""
+        # Format dates
+        elif fieldtype in _DATE_FIELDTYPES:
+            data[fieldname] = formatdate(field_value)
+        # Format currency
+        elif fieldtype == "Currency":
+            data[fieldname] = fmt_money(field_value, currency=currency)
+        else:
+            data[fieldname] = str(field_value)
 
     # Extract items if present (for invoice-like documents)
     data["items"] = extract_items_summary(doc, currency)
@@ -379,51 +637,28 @@ def build_template_data(doc, doctype, company_info, config, custom_message=None)
     return data
 
 
+def _first_set_value(doc, fieldnames):
+    """Get the first truthy value among the given fields of a document."""
+    return next(
+        (value for value in (getattr(doc, f, None) for f in fieldnames) if value), None
+    )
+
+
 def extract_date_field(doc):
     """Extract document date from common date fields."""
-    for date_field in [
-        "posting_date",
-        "transaction_date",
-        "application_date",
-        "repayment_date",
-        "creation",
-    ]:
-        if hasattr(doc, date_field) and getattr(doc, date_field):
-            return formatdate(getattr(doc, date_field))
-    return ""
+    value = _first_set_value(doc, _DATE_FIELDS)
+    return formatdate(value) if value else ""
 
 
 def extract_amount_field(doc, currency):
     """Extract total amount from common amount fields."""
-    for amount_field in [
-        "grand_total",
-        "total",
-        "loan_amount",
-        "total_payment",
-        "outstanding_amount",
-        "paid_amount",
-        "total_amount",
-    ]:
-        if hasattr(doc, amount_field):
-            amount = getattr(doc, amount_field)
-            if amount:
-                return fmt_money(amount, currency=currency)
-    return ""
+    amount = _first_set_value(doc, _AMOUNT_FIELDS)
+    return fmt_money(amount, currency=currency) if amount else ""
 
 
 def extract_party_name(doc):
     """Extract party/customer name from common fields."""
-    for party_field in [
-        "customer_name",
-        "party_name",
-        "applicant_name",
-        "borrower_name",
-        "supplier_name",
-        "title",
-    ]:
-        if hasattr(doc, party_field) and getattr(doc, party_field):
-            return getattr(doc, party_field)
-    return ""
+    return _first_set_value(doc, _PARTY_NAME_FIELDS) or ""
 
 
 def extract_items_summary(doc, currency, max_items=5):
@@ -449,24 +684,36 @@ def extract_items_summary(doc, currency, max_items=5):
     return items_summary
 
 
+@lru_cache(maxsize=256)
+def _compile_subject_template(template):
+    """Compile a subject template once; keyed on its source, so never stale."""
+    return _subject_env.from_string(template)
+
+
+@lru_cache(maxsize=32)
+def _compile_html_template(template):
+    """Compile an autoescaped HTML body template once per (translated) source."""
+    return _html_env.from_string(template)
+
+
 def render_subject_template(template, doc, company_info):
     """Render subject line from Jinja template."""
     try:
-        from jinja2 import Template
-
-        t = Template(template)
-        return t.render(doc=doc, company=company_info.get("company_name", ""))
+        return _compile_subject_template(template).render(
+            doc=doc, company=company_info.get("company_name", "")
+        )
     except Exception:
         return _("{0} {1}").format(doc.doctype, doc.name)
 
 
-def generate_pdf_attachment(doctype, docname, print_format=None):
+def generate_pdf_attachment(doctype, docname, print_format=None, settings=None):
     """Generate PDF attachment for document."""
     try:
-        pdf_bytes, filename = get_document_pdf(doctype, docname, print_format)
-        return [{"filename": filename, "content": pdf_to_base64(pdf_bytes)}]
+        return [
+            get_document_pdf_attachment(doctype, docname, print_format, settings=settings)
+        ]
     except Exception as e:
-        frappe.log_error(
+        log_send_error(
             title=_("{0} PDF Generation Failed").format(doctype), message=str(e)
         )
         return None
@@ -478,14 +725,7 @@ def send_fallback_email(doc, doctype, docname, to_email, template_data):
         frappe.sendmail(
             recipients=[to_email],
             subject=template_data.get("subject", _("{0} from ERPNext").format(doctype)),
-            message=_(
-                """
-                <p>Dear {customer_name},</p>
-                <p>Please find attached your {document_type}.</p>
-                <p>Total Amount: {total_amount}</p>
-                <p>Best regards,<br>{company_name}</p>
-            """
-            ).format(
+            message=_compile_html_template(_(_FALLBACK_MESSAGE)).render(
                 customer_name=template_data.get("customer_name", _("Customer")),
                 document_type=doctype.lower(),
                 total_amount=template_data.get("total_amount", "N/A"),
@@ -503,7 +743,7 @@ def send_fallback_email(doc, doctype, docname, to_email, template_data):
         }
 
     except Exception as e:
-        frappe.log_error(title=_("Fallback Email Failed"), message=str(e))
+        log_send_error(title=_("Fallback Email Failed"), message=str(e))
         raise
 
 
@@ -7,18 +7,19 @@ from emails.email_service.utils import (
     get_company_info,
     get_customer_primary_email,
     format_currency_amount,
-    get_document_pdf,
-    pdf_to_base64,
+    get_document_pdf_attachment,
     create_communication_log,
-    get_document_link,
+    log_sent_communication,
+    get_common_template_data,
+    get_email_tags,
 )
 
 
-def send_invoice_email(invoice_name, to_email=None, cc=None, bcc=None, custom_message=None, skip_communication=False):
+def send_invoice_email(invoice_name, to_email=None, cc=None, bcc=None, custom_message=None, skip_communication=False, attach_pdf=None):
     """Send Sales Invoice email via Resend."""
     settings = get_email_settings()
 
-    invoice = frappe.get_doc("Sales Invoice", invoice_name)
+    invoice = frappe.get_cached_doc("Sales Invoice", invoice_name)
 
     if invoice.docstatus != 1:
         frappe.throw(f"Invoice {invoice_name} must be submitted before sending email")
@@ -33,24 +34,20 @@ def send_invoice_email(invoice_name, to_email=None, cc=None, bcc=None, custom_me
 
     template_id = settings.invoice_template_id or ""
 
+    invoice_date = formatdate(invoice.posting_date)
+
     template_data = {
         "document_type": "Invoice",
         "customer_name": invoice.customer_name or invoice.customer,
         "invoice_number": invoice.name,
         "document_number": invoice.name,
-        "invoice_date": formatdate(invoice.posting_date),
-        "document_date": formatdate(invoice.posting_date),
+        "invoice_date": invoice_date,
+        "document_date": invoice_date,
         "due_date": formatdate(invoice.due_date) if invoice.due_date else "",
         "total_amount": format_currency_amount(invoice.grand_total, invoice.currency),
         "outstanding_amount": format_currency_amount(invoice.outstanding_amount, invoice.currency),
         "currency": invoice.currency,
-        "company_name": company_info["company_name"],
-        "company_logo": company_info["company_logo"] or "",
-        "company_address": company_info["company_address"] or "",
-        "company_phone": company_info["phone"] or "",
-        "company_email": company_info["email"] or "",
-        "document_link": get_document_link("Sales Invoice", invoice_name),
-        "custom_message": custom_message or "",
+        **get_common_template_data("Sales Invoice", invoice_name, company_info, custom_message),
         "subject": f"Invoice {invoice.name} from {company_info['company_name']}",
     }
 
@@ -65,15 +62,12 @@ def send_invoice_email(invoice_name, to_email=None, cc=None, bcc=None, custom_me
     template_data["items"] = items_summary
     template_data["items_count"] = len(invoice.items)
 
-    try:
-        pdf_bytes, filename = get_document_pdf("Sales Invoice", invoice_name)
-        attachments = [{
-            "filename": filename,
-            "content": pdf_to_base64(pdf_bytes)
-        }]
-    except Exception as e:
-        frappe.log_error(title="Invoice PDF Generation Failed", message=str(e))
-        attachments = None
+    attachments = None
+    if settings.should_attach_pdf("Sales Invoice", attach_pdf):
+        try:
+            attachments = [get_document_pdf_attachment("Sales Invoice", invoice_name, settings=settings)]
+        except Exception as e:
+            frappe.log_error(title="Invoice PDF Generation Failed", message=str(e))
 
     try:
         result = send_template_email(
@@ -84,14 +78,11 @@ def send_invoice_email(invoice_name, to_email=None, cc=None, bcc=None, custom_me
             cc=cc,
             bcc=bcc,
             attachments=attachments,
-            tags=[
-                {"name": "doctype", "value": "sales_invoice"},
-                {"name": "document", "value": invoice_name.replace("-", "_").replace(" ", "_")}
-            ]
+            tags=get_email_tags("Sales Invoice", invoice_name)
         )
 
         if not skip_communication:
-            create_communication_log(
+            log_sent_communication(
                 doctype="Sales Invoice",
                 docname=invoice_name,
                 recipient=to_email,
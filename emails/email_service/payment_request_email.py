@@ -7,18 +7,19 @@ from emails.email_service.utils import (
     get_company_info,
     get_customer_primary_email,
     format_currency_amount,
-    get_document_pdf,
-    pdf_to_base64,
+    get_document_pdf_attachment,
     create_communication_log,
-    get_document_link,
+    log_sent_communication,
+    get_common_template_data,
+    get_email_tags,
 )
 
 
-def send_payment_request_email(payment_request_name, to_email=None, cc=None, bcc=None, custom_message=None, skip_communication=False):
+def send_payment_request_email(payment_request_name, to_email=None, cc=None, bcc=None, custom_message=None, skip_communication=False, attach_pdf=None):
     """Send Payment Request email via Resend."""
     settings = get_email_settings()
 
-    payment_request = frappe.get_doc("Payment Request", payment_request_name)
+    payment_request = frappe.get_cached_doc("Payment Request", payment_request_name)
 
     if payment_request.docstatus != 1:
         frappe.throw(f"Payment Request {payment_request_name} must be submitted before sending email")
@@ -47,29 +48,29 @@ def send_payment_request_email(payment_request_name, to_email=None, cc=None, bcc
     # Get party name for display
     party_name = ""
     if payment_request.party_type == "Customer" and payment_request.party:
-        party_name = frappe.db.get_value("Customer", payment_request.party, "customer_name") or payment_request.party
+        party_name = frappe.get_cached_value("Customer", payment_request.party, "customer_name") or payment_request.party
     elif payment_request.party:
         party_name = payment_request.party
 
+    # The request date doubles as the document and due date
+    transaction_date = (
+        formatdate(payment_request.transaction_date) if payment_request.transaction_date else ""
+    )
+    grand_total = format_currency_amount(payment_request.grand_total, payment_request.currency)
+
     template_data = {
         "document_type": "Payment Request",
         "customer_name": party_name,
         "party_name": party_name,
         "payment_request_number": payment_request.name,
         "document_number": payment_request.name,
-        "transaction_date": formatdate(payment_request.transaction_date) if payment_request.transaction_date else "",
-        "document_date": formatdate(payment_request.transaction_date) if payment_request.transaction_date else "",
-        "due_date": formatdate(payment_request.transaction_date) if payment_request.transaction_date else "",
-        "grand_total": format_currency_amount(payment_request.grand_total, payment_request.currency),
-        "total_amount": format_currency_amount(payment_request.grand_total, payment_request.currency),
+        "transaction_date": transaction_date,
+        "document_date": transaction_date,
+        "due_date": transaction_date,
+        "grand_total": grand_total,
+        "total_amount": grand_total,
         "currency": payment_request.currency,
-        "company_name": company_info["company_name"],
-        "company_logo": company_info["company_logo"] or "",
-        "company_address": company_info["company_address"] or "",
-        "company_phone": company_info["phone"] or "",
-        "company_email": company_info["email"] or "",
-        "document_link": get_document_link("Payment Request", payment_request_name),
-        "custom_message": custom_message or "",
+        **get_common_template_data("Payment Request", payment_request_name, company_info, custom_message),
         "subject": f"Payment Request {payment_request.name} from {company_info['company_name']}",
 
         # Stripe-specific field
@@ -91,7 +92,7 @@ def send_payment_request_email(payment_request_name, to_email=None, cc=None, bcc
     # Add Sales Invoice details if reference is a Sales Invoice
     if payment_request.reference_doctype == "Sales Invoice" and payment_request.reference_name:
         try:
-            invoice = frappe.get_doc("Sales Invoice", payment_request.reference_name)
+            invoice = frappe.get_cached_doc("Sales Invoice", payment_request.reference_name)
             template_data["invoice_number"] = invoice.name
             template_data["invoice_date"] = formatdate(invoice.posting_date)
             template_data["invoice_due_date"] = formatdate(invoice.due_date) if invoice.due_date else ""
@@ -102,13 +103,13 @@ def send_payment_request_email(payment_request_name, to_email=None, cc=None, bcc
 
     # Attempt to get Sales Invoice PDF (from reference document)
     attachments = None
-    if payment_request.reference_doctype == "Sales Invoice" and payment_request.reference_name:
+    if (
+        payment_request.reference_doctype == "Sales Invoice"
+        and payment_request.reference_name
+        and settings.should_attach_pdf("Payment Request", attach_pdf)
+    ):
         try:
-            pdf_bytes, filename = get_document_pdf("Sales Invoice", payment_request.reference_name)
-            attachments = [{
-                "filename": filename,
-                "content": pdf_to_base64(pdf_bytes)
-            }]
+            attachments = [get_document_pdf_attachment("Sales Invoice", payment_request.reference_name, settings=settings)]
         except Exception as e:
             frappe.log_error(title="Sales Invoice PDF Generation Failed", message=str(e))
 
@@ -121,14 +122,11 @@ def send_payment_request_email(payment_request_name, to_email=None, cc=None, bcc
             cc=cc,
             bcc=bcc,
             attachments=attachments,
-            tags=[
-                {"name": "doctype", "value": "payment_request"},
-                {"name": "document", "value": payment_request_name.replace("-", "_").replace(" ", "_")}
-            ]
+            tags=get_email_tags("Payment Request", payment_request_name)
         )
 
         if not skip_communication:
-            create_communication_log(
+            log_sent_communication(
                 doctype="Payment Request",
                 docname=payment_request_name,
                 recipient=to_email,
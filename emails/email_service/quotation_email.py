@@ -7,18 +7,36 @@ from emails.email_service.utils import (
     get_company_info,
     get_customer_primary_email,
     format_currency_amount,
-    get_document_pdf,
-    pdf_to_base64,
+    get_document_pdf_attachment,
     create_communication_log,
-    get_document_link,
+    log_sent_communication,
+    get_common_template_data,
+    get_email_tags,
+    get_items_summary,
+)
+
+# Quotation fields used to build the email, read instead of the whole document
+_QUOTATION_FIELDS = (
+    "docstatus",
+    "quotation_to",
+    "party_name",
+    "customer_name",
+    "contact_email",
+    "company",
+    "transaction_date",
+    "valid_till",
+    "grand_total",
+    "currency",
 )
 
 
-def send_quotation_email(quotation_name, to_email=None, cc=None, bcc=None, custom_message=None, skip_communication=False):
+def send_quotation_email(quotation_name, to_email=None, cc=None, bcc=None, custom_message=None, skip_communication=False, attach_pdf=None):
     """Send Quotation email via Resend."""
     settings = get_email_settings()
 
-    quotation = frappe.get_doc("Quotation", quotation_name)
+    quotation = frappe.db.get_value("Quotation", quotation_name, _QUOTATION_FIELDS, as_dict=True)
+    if not quotation:
+        frappe.throw(f"Quotation {quotation_name} not found", frappe.DoesNotExistError)
 
     if quotation.docstatus != 1:
         frappe.throw(f"Quotation {quotation_name} must be submitted before sending email")
@@ -36,52 +54,37 @@ def send_quotation_email(quotation_name, to_email=None, cc=None, bcc=None, custo
 
     template_id = settings.quotation_template_id or ""
 
-    valid_until = ""
-    if quotation.valid_till:
-        valid_until = formatdate(quotation.valid_till)
-    elif quotation.transaction_date:
-        valid_until = formatdate(add_days(quotation.transaction_date, 30))
+    quotation_date = formatdate(quotation.transaction_date)
+
+    valid_till = quotation.valid_till
+    if not valid_till and quotation.transaction_date:
+        valid_till = add_days(quotation.transaction_date, 30)
+    valid_until = formatdate(valid_till) if valid_till else ""
 
     template_data = {
         "document_type": "Quotation",
         "customer_name": quotation.customer_name or quotation.party_name,
-        "quotation_number": quotation.name,
-        "document_number": quotation.name,
-        "quotation_date": formatdate(quotation.transaction_date),
-        "document_date": formatdate(quotation.transaction_date),
+        "quotation_number": quotation_name,
+        "document_number": quotation_name,
+        "quotation_date": quotation_date,
+        "document_date": quotation_date,
         "valid_until": valid_until,
         "total_amount": format_currency_amount(quotation.grand_total, quotation.currency),
         "currency": quotation.currency,
-        "company_name": company_info["company_name"],
-        "company_logo": company_info["company_logo"] or "",
-        "company_address": company_info["company_address"] or "",
-        "company_phone": company_info["phone"] or "",
-        "company_email": company_info["email"] or "",
-        "document_link": get_document_link("Quotation", quotation_name),
-        "custom_message": custom_message or "",
-        "subject": f"Quotation {quotation.name} from {company_info['company_name']}",
+        **get_common_template_data("Quotation", quotation_name, company_info, custom_message),
+        "subject": f"Quotation {quotation_name} from {company_info['company_name']}",
     }
 
-    items_summary = []
-    for item in quotation.items[:5]:
-        items_summary.append({
-            "item_name": item.item_name,
-            "qty": item.qty,
-            "rate": format_currency_amount(item.rate, quotation.currency),
-            "amount": format_currency_amount(item.amount, quotation.currency),
-        })
-    template_data["items"] = items_summary
-    template_data["items_count"] = len(quotation.items)
+    template_data["items"], template_data["items_count"] = get_items_summary(
+        "Quotation Item", quotation_name, quotation.currency
+    )
 
-    try:
-        pdf_bytes, filename = get_document_pdf("Quotation", quotation_name)
-        attachments = [{
-            "filename": filename,
-            "content": pdf_to_base64(pdf_bytes)
-        }]
-    except Exception as e:
-        frappe.log_error(title="Quotation PDF Generation Failed", message=str(e))
-        attachments = None
+    attachments = None
+    if settings.should_attach_pdf("Quotation", attach_pdf):
+        try:
+            attachments = [get_document_pdf_attachment("Quotation", quotation_name, settings=settings)]
+        except Exception as e:
+            frappe.log_error(title="Quotation PDF Generation Failed", message=str(e))
 
     try:
         result = send_template_email(
@@ -92,14 +95,11 @@ def send_quotation_email(quotation_name, to_email=None, cc=None, bcc=None, custo
             cc=cc,
             bcc=bcc,
             attachments=attachments,
-            tags=[
-                {"name": "doctype", "value": "quotation"},
-                {"name": "document", "value": quotation_name.replace("-", "_").replace(" ", "_")}
-            ]
+            tags=get_email_tags("Quotation", quotation_name)
         )
 
         if not skip_communication:
-            create_communication_log(
+            log_sent_communication(
                 doctype="Quotation",
                 docname=quotation_name,
                 recipient=to_email,
@@ -1,9 +1,225 @@
+import atexit
 import json
 import re
+import time
+from contextlib import contextmanager
+from functools import lru_cache
 import frappe
 import requests
+from jinja2 import Environment
+from frappe.utils import cint, nowdate
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from emails.email_service.utils import (
+    RESEND_CONNECTION_CACHE_KEY,
+    get_resend_api_key,
+    log_send_error,
+)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 RESEND_API_URL = "https://api.resend.com/emails"
+RESEND_BATCH_API_URL = "https://api.resend.com/emails/batch"
+
+# Most emails Resend accepts in one batch request
+RESEND_BATCH_SIZE = 100
+
+# Resend's default per-team API rate limit, overridable with the
+# resend_rate_limit key in site_config.json
+RESEND_DEFAULT_RATE_LIMIT = 2
+RESEND_RATE_CACHE_KEY = "emails:resend_rate"
+
+# Redis counter of emails sent today, checked against the Daily Send Limit
+RESEND_DAILY_COUNT_CACHE_KEY = "emails:sent_today"
+
+# Attempts per request when Resend answers 429 Too Many Requests
+RESEND_MAX_RATE_LIMITED_ATTEMPTS = 3
+
+# Longest Retry-After delay honoured, so a bad header can't hold a worker
+RESEND_MAX_RETRY_AFTER = 30
+
+# Token bucket holding up to one second of requests. Takes a token and returns
+# 0, or returns the seconds to wait for the next one (as a string, since Lua
+# numbers are truncated to integers on return).
+_TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local now = tonumber(ARGV[2])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or rate
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(rate, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], 60)
+return tostring(wait)
+"""
+
+# Body of template emails sent without a Resend template ID, compiled once at
+# import. Document values are escaped; the custom message is the sender's own
+# HTML and is kept as-is.
+_FALLBACK_HTML_TEMPLATE = Environment(auto_reload=False, autoescape=True).from_string(
+    """
+<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="utf-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>{{ document_type }} from {{ company_name }}</title>
+</head>
+<body style="font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, 'Helvetica Neue', Arial, sans-serif; line-height: 1.6; color: #333; max-width: 600px; margin: 0 auto; padding: 20px;">
+    <div style="background-color: #f8f9fa; padding: 30px; border-radius: 8px;">
+        <h2 style="color: #2c3e50; margin-top: 0;">{{ document_type }} from {{ company_name }}</h2>
+
+        <p>Hi {{ customer_name }},</p>
+
+        <p>Please find your {{ document_type | lower }} details below:</p>
+
+        <table style="width: 100%; border-collapse: collapse; margin: 20px 0;">
+            <tr>
+                <td style="padding: 10px; border-bottom: 1px solid #dee2e6;"><strong>{{ document_type }} Number:</strong></td>
+                <td style="padding: 10px; border-bottom: 1px solid #dee2e6;">{{ document_number }}</td>
+            </tr>
+            <tr>
+                <td style="padding: 10px; border-bottom: 1px solid #dee2e6;"><strong>Date:</strong></td>
+                <td style="padding: 10px; border-bottom: 1px solid #dee2e6;">{{ document_date }}</td>
+            </tr>
+            {% if due_date %}<tr><td style='padding: 10px; border-bottom: 1px solid #dee2e6;'><strong>Due Date:</strong></td><td style='padding: 10px; border-bottom: 1px solid #dee2e6;'>{{ due_date }}</td></tr>{% endif %}
+            <tr>
+                <td style="padding: 10px; border-bottom: 1px solid #dee2e6;"><strong>Total Amount:</strong></td>
+                <td style="padding: 10px; border-bottom: 1px solid #dee2e6; font-size: 18px; color: #2c3e50;"><strong>{{ total_amount }}</strong></td>
+            </tr>
+        </table>
+
+        {% if custom_message %}<p>{{ custom_message | safe }}</p>{% endif %}
+
+        <p>Please find the detailed {{ document_type | lower }} attached as a PDF.</p>
+
+        <hr style="border: none; border-top: 1px solid #dee2e6; margin: 30px 0;">
+
+        <p style="color: #6c757d; font-size: 14px;">
+            Best regards,<br>
+            <strong>{{ company_name }}</strong>
+        </p>
+    </div>
+</body>
+</html>
+"""
+)
+
+# Shared HTTPS session, so sends from the same worker reuse kept-alive connections
+_session = None
+
+
+def get_session():
+    """
+    Get the pooled requests session used for Resend API calls.
+
+    Only idempotent requests (GET) are retried - a retried POST could send the
+    same email twice.
+    """
+    global _session
+    if _session is None:
+        session = requests.Session()
+        session.mount(
+            "https://",
+            HTTPAdapter(
+                pool_connections=4,
+                pool_maxsize=16,
+                max_retries=Retry(
+                    total=3,
+                    backoff_factor=0.3,
+                    status_forcelist=[429, 500, 502, 503, 504],
+                ),
+            ),
+        )
+        _session = session
+
+        # Close pooled connections cleanly when the worker process exits
+        atexit.register(session.close)
+
+    return _session
+
+
+def wait_for_rate_limit():
+    """
+    Block until a Resend API request token is available.
+
+    The token bucket lives in Redis and is updated atomically by a Lua script,
+    so every web and background worker on the site shares Resend's per-team
+    rate limit instead of each running into 429 responses.
+    """
+    rate = frappe.conf.get("resend_rate_limit") or RESEND_DEFAULT_RATE_LIMIT
+    cache = frappe.cache()
+    key = cache.make_key(RESEND_RATE_CACHE_KEY)
+
+    while True:
+        wait = float(cache.eval(_TOKEN_BUCKET_SCRIPT, 1, key, rate, time.time()))
+        if not wait:
+            return
+
+        time.sleep(wait)
+
+
+@lru_cache(maxsize=16)
+def _api_headers(api_key):
+    """Request headers for the Resend API (shared, so callers must not modify them)."""
+    # Keyed by API key rather than set on the shared session: a worker serves
+    # several sites, each with its own key
+    return {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+
+
+def _dumps(payload):
+    """Serialize a request payload, with orjson when it is installed (it ships with Frappe)."""
+    if orjson:
+        return orjson.dumps(payload)
+    return json.dumps(payload).encode()
+
+
+def _response_json(response):
+    """Parse a Resend API response body."""
+    try:
+        return orjson.loads(response.content) if orjson else response.json()
+    except ValueError as e:
+        # Surface a non-JSON body like requests does, as a RequestException
+        raise requests.exceptions.InvalidJSONError(str(e), response=response)
+
+
+def _post(url, headers, payload, timeout=30):
+    """
+    POST to the Resend API within the shared rate limit.
+
+    A 429 means Resend rejected the request without sending anything, so it is
+    retried after the Retry-After delay Resend asks for (at most
+    RESEND_MAX_RETRY_AFTER seconds).
+    """
+    # Large base64 attachments make serialization the costly part, so it is
+    # done once, not on every rate-limited attempt
+    data = _dumps(payload)
+
+    for attempt in range(RESEND_MAX_RATE_LIMITED_ATTEMPTS):
+        wait_for_rate_limit()
+        response = get_session().post(url, headers=headers, data=data, timeout=timeout)
+
+        if response.status_code != 429 or attempt == RESEND_MAX_RATE_LIMITED_ATTEMPTS - 1:
+            return response
+
+        try:
+            retry_after = float(response.headers.get("Retry-After", 1))
+        except ValueError:
+            retry_after = 1
+        # Also catches NaN, which fails every comparison
+        if not retry_after >= 0:
+            retry_after = 1
+        time.sleep(min(retry_after, RESEND_MAX_RETRY_AFTER))
 
 
 def clean_email_list(emails):
@@ -55,20 +271,79 @@ class ResendError(Exception):
     pass
 
 
-def get_api_key():
-    """Get Resend API key from settings"""
-    settings = frappe.get_single("Email Service Settings")
+def get_api_key(settings=None):
+    """Get Resend API key from settings (pass them in if already loaded)"""
+    settings = settings or frappe.get_cached_doc("Email Service Settings")
     if not settings.enabled:
         raise ResendError("Email Service is not enabled")
 
-    api_key = settings.get_password("resend_api_key")
+    api_key = get_resend_api_key()
     if not api_key:
         raise ResendError("Resend API key not configured")
 
     return api_key
 
 
-def send_email(
+def reserve_daily_quota(settings, count=1):
+    """
+    Count emails against the optional Daily Send Limit.
+
+    Returns:
+        bool: Whether the emails were counted (a limit is set)
+
+    Raises:
+        ResendError: If sending count more emails would exceed the limit
+    """
+    limit = cint(settings.get("daily_send_limit"))
+    if not limit:
+        return False
+
+    cache = frappe.cache()
+    key = _daily_count_key()
+    sent = cache.incrby(key, count)
+    cache.expire(key, 26 * 60 * 60)
+
+    if sent > limit:
+        cache.decrby(key, count)
+        raise ResendError(f"Daily send limit of {limit} emails reached")
+
+    return True
+
+
+def release_daily_quota(count=1):
+    """Give back Daily Send Limit quota reserved for emails that weren't sent."""
+    frappe.cache().decrby(_daily_count_key(), count)
+
+
+def _daily_count_key():
+    """Redis key of today's sent email counter."""
+    return frappe.cache().make_key(f"{RESEND_DAILY_COUNT_CACHE_KEY}:{nowdate()}")
+
+
+@contextmanager
+def _reserved_daily_quota(settings, count=1):
+    """Reserve Daily Send Limit quota for a send, releasing it if the send fails."""
+    reserved = reserve_daily_quota(settings, count)
+    try:
+        yield
+    except Exception:
+        if reserved:
+            release_daily_quota(count)
+        raise
+
+
+def _payload_for_log(payload):
+    """Serialize a request payload for the Error Log, without attachment contents."""
+    if payload.get("attachments"):
+        payload = {
+            **payload,
+            "attachments": [a.get("filename") for a in payload["attachments"]],
+        }
+    return json.dumps(payload, separators=(",", ":"))
+
+
+def _build_email_payload(
+    settings,
     to_email,
     subject,
     html_content=None,
@@ -81,31 +356,7 @@ def send_email(
     attachments=None,
     tags=None
 ):
-    """
-    Send email directly with HTML/text content (no template).
-
-    Args:
-        to_email: Recipient email (string or list)
-        subject: Email subject
-        html_content: HTML body content
-        text_content: Plain text body content
-        from_email: Sender email (optional, uses default)
-        from_name: Sender name (optional)
-        reply_to: Reply-to email address
-        cc: CC recipients (string or list)
-        bcc: BCC recipients (string or list)
-        attachments: List of attachment dicts [{filename, content (base64)}]
-        tags: List of tag dicts for tracking [{name, value}]
-
-    Returns:
-        dict: Response with message_id on success
-
-    Raises:
-        ResendError: On API failure
-    """
-    api_key = get_api_key()
-    settings = frappe.get_single("Email Service Settings")
-
+    """Build the Resend API payload for a plain (non-template) email."""
     # Build sender
     if not from_email:
         from_email = settings.default_sender_email
@@ -147,51 +398,16 @@ def send_email(
     if tags:
         payload["tags"] = tags
 
-    # Make API request
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
-
-    try:
-        response = requests.post(
-            RESEND_API_URL,
-            headers=headers,
-            json=payload,
-            timeout=30
-        )
-
-        response_data = response.json()
-
-        if response.status_code == 200:
-            return {
-                "success": True,
-                "message_id": response_data.get("id"),
-                "response": response_data
-            }
-        else:
-            error_msg = response_data.get("message", response_data.get("error", "Unknown error"))
-            frappe.log_error(
-                title="Resend API Error",
-                message=f"Status: {response.status_code}\nResponse: {json.dumps(response_data, indent=2)}\nPayload: {json.dumps(payload, indent=2)}"
-            )
-            raise ResendError(f"Resend API error: {error_msg}")
-
-    except requests.exceptions.Timeout:
-        frappe.log_error(title="Resend API Timeout", message="Request timed out after 30 seconds")
-        raise ResendError("Resend API request timed out")
-    except requests.exceptions.RequestException as e:
-        frappe.log_error(title="Resend API Request Error", message=str(e))
-        raise ResendError(f"Resend API request failed: {str(e)}")
+    return payload
 
 
-def send_template_email(
-    template_id,
+def send_email(
     to_email,
-    template_data,
+    subject,
+    html_content=None,
+    text_content=None,
     from_email=None,
     from_name=None,
-    subject=None,
     reply_to=None,
     cc=None,
     bcc=None,
@@ -199,15 +415,15 @@ def send_template_email(
     tags=None
 ):
     """
-    Send email using a Resend template.
+    Send email directly with HTML/text content (no template).
 
     Args:
-        template_id: Resend template ID (e.g., 'template_abc123')
         to_email: Recipient email (string or list)
-        template_data: Dict of variables to pass to template
+        subject: Email subject
+        html_content: HTML body content
+        text_content: Plain text body content
         from_email: Sender email (optional, uses default)
         from_name: Sender name (optional)
-        subject: Override template subject (optional)
         reply_to: Reply-to email address
         cc: CC recipients (string or list)
         bcc: BCC recipients (string or list)
@@ -220,9 +436,104 @@ def send_template_email(
     Raises:
         ResendError: On API failure
     """
-    api_key = get_api_key()
-    settings = frappe.get_single("Email Service Settings")
+    settings = frappe.get_cached_doc("Email Service Settings")
+    api_key = get_api_key(settings)
+
+    payload = _build_email_payload(
+        settings,
+        to_email,
+        subject,
+        html_content=html_content,
+        text_content=text_content,
+        from_email=from_email,
+        from_name=from_name,
+        reply_to=reply_to,
+        cc=cc,
+        bcc=bcc,
+        attachments=attachments,
+        tags=tags,
+    )
+
+    # Make API request
+    headers = _api_headers(api_key)
+
+    with _reserved_daily_quota(settings):
+        try:
+            response = _post(RESEND_API_URL, headers, payload)
+
+            response_data = _response_json(response)
+
+            if response.status_code == 200:
+                return {
+                    "success": True,
+                    "message_id": response_data.get("id"),
+                    "response": response_data
+                }
+            else:
+                error_msg = response_data.get("message", response_data.get("error", "Unknown error"))
+                log_send_error(
+                    title="Resend API Error",
+                    message=f"Status: {response.status_code}\nResponse: {json.dumps(response_data, indent=2)}\nPayload: {_payload_for_log(payload)}"
+                )
+                raise ResendError(f"Resend API error: {error_msg}")
+
+        except requests.exceptions.Timeout:
+            log_send_error(title="Resend API Timeout", message="Request timed out after 30 seconds")
+            raise ResendError("Resend API request timed out")
+        except requests.exceptions.RequestException as e:
+            log_send_error(title="Resend API Request Error", message=str(e))
+            raise ResendError(f"Resend API request failed: {str(e)}")
+
+
+def _send_batch(settings, api_key, batch, message_ids):
+    """
+    POST (index, payload) pairs to Resend's batch endpoint, RESEND_BATCH_SIZE per
+    call, filling in message_ids at each index.
+    """
+    headers = _api_headers(api_key)
 
+    for start in range(0, len(batch), RESEND_BATCH_SIZE):
+        chunk = batch[start:start + RESEND_BATCH_SIZE]
+        with _reserved_daily_quota(settings, len(chunk)):
+            try:
+                response = _post(RESEND_BATCH_API_URL, headers, [payload for _idx, payload in chunk])
+
+                response_data = _response_json(response)
+
+                if response.status_code != 200:
+                    error_msg = response_data.get("message", response_data.get("error", "Unknown error"))
+                    log_send_error(
+                        title="Resend API Error",
+                        message=f"Status: {response.status_code}\nResponse: {json.dumps(response_data, indent=2)}"
+                    )
+                    raise ResendError(f"Resend API error: {error_msg}")
+
+            except requests.exceptions.Timeout:
+                log_send_error(title="Resend API Timeout", message="Batch request timed out after 30 seconds")
+                raise ResendError("Resend API request timed out")
+            except requests.exceptions.RequestException as e:
+                log_send_error(title="Resend API Request Error", message=str(e))
+                raise ResendError(f"Resend API request failed: {str(e)}")
+
+        for (idx, _payload), sent in zip(chunk, response_data.get("data", [])):
+            message_ids[idx] = sent.get("id")
+
+
+def _build_template_payload(
+    settings,
+    template_id,
+    to_email,
+    template_data,
+    from_email=None,
+    from_name=None,
+    subject=None,
+    reply_to=None,
+    cc=None,
+    bcc=None,
+    attachments=None,
+    tags=None,
+):
+    """Build the Resend API payload for a template email."""
     # Build sender
     if not from_email:
         from_email = settings.default_sender_email
@@ -293,134 +604,184 @@ def send_template_email(
         if not subject:
             payload["subject"] = template_data.get("subject", "Document from ERPNext")
 
-    # Make API request
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
+    return payload
 
-    try:
-        response = requests.post(
-            RESEND_API_URL,
-            headers=headers,
-            json=payload,
-            timeout=30
-        )
 
-        response_data = response.json()
+def send_template_email(
+    template_id,
+    to_email,
+    template_data,
+    from_email=None,
+    from_name=None,
+    subject=None,
+    reply_to=None,
+    cc=None,
+    bcc=None,
+    attachments=None,
+    tags=None
+):
+    """
+    Send email using a Resend template.
 
-        if response.status_code == 200:
-            if frappe.get_single("Email Service Settings").log_all_attempts:
-                frappe.log_error(
-                    title="Resend Email Sent",
-                    message=f"To: {to_email}\nMessage ID: {response_data.get('id')}"
+    Args:
+        template_id: Resend template ID (e.g., 'template_abc123')
+        to_email: Recipient email (string or list)
+        template_data: Dict of variables to pass to template
+        from_email: Sender email (optional, uses default)
+        from_name: Sender name (optional)
+        subject: Override template subject (optional)
+        reply_to: Reply-to email address
+        cc: CC recipients (string or list)
+        bcc: BCC recipients (string or list)
+        attachments: List of attachment dicts [{filename, content (base64)}]
+        tags: List of tag dicts for tracking [{name, value}]
+
+    Returns:
+        dict: Response with message_id on success
+
+    Raises:
+        ResendError: On API failure
+    """
+    settings = frappe.get_cached_doc("Email Service Settings")
+    api_key = get_api_key(settings)
+
+    payload = _build_template_payload(
+        settings,
+        template_id,
+        to_email,
+        template_data,
+        from_email=from_email,
+        from_name=from_name,
+        subject=subject,
+        reply_to=reply_to,
+        cc=cc,
+        bcc=bcc,
+        attachments=attachments,
+        tags=tags,
+    )
+    to_email = payload["to"]
+
+    # Make API request
+    headers = _api_headers(api_key)
+
+    with _reserved_daily_quota(settings):
+        try:
+            response = _post(RESEND_API_URL, headers, payload)
+
+            response_data = _response_json(response)
+
+            if response.status_code == 200:
+                if settings.log_all_attempts:
+                    log_send_error(
+                        title="Resend Email Sent",
+                        message=f"To: {to_email}\nMessage ID: {response_data.get('id')}",
+                        # Log All Attempts asks for every send, so don't sample
+                        sample=False,
+                    )
+                return {
+                    "success": True,
+                    "message_id": response_data.get("id"),
+                    "response": response_data
+                }
+            else:
+                error_msg = response_data.get("message", response_data.get("error", "Unknown error"))
+                log_send_error(
+                    title="Resend API Error",
+                    message=f"Status: {response.status_code}\nResponse: {json.dumps(response_data, indent=2)}"
                 )
-            return {
-                "success": True,
-                "message_id": response_data.get("id"),
-                "response": response_data
-            }
-        else:
-            error_msg = response_data.get("message", response_data.get("error", "Unknown error"))
-            frappe.log_error(
-                title="Resend API Error",
-                message=f"Status: {response.status_code}\nResponse: {json.dumps(response_data, indent=2)}"
-            )
-            raise ResendError(f"Resend API error: {error_msg}")
+                raise ResendError(f"Resend API error: {error_msg}")
 
-    except requests.exceptions.Timeout:
-        frappe.log_error(title="Resend API Timeout", message="Request timed out")
-        raise ResendError("Resend API request timed out")
-    except requests.exceptions.RequestException as e:
-        frappe.log_error(title="Resend API Request Error", message=str(e))
-        raise ResendError(f"Resend API request failed: {str(e)}")
+        except requests.exceptions.Timeout:
+            log_send_error(title="Resend API Timeout", message="Request timed out")
+            raise ResendError("Resend API request timed out")
+        except requests.exceptions.RequestException as e:
+            log_send_error(title="Resend API Request Error", message=str(e))
+            raise ResendError(f"Resend API request failed: {str(e)}")
 
 
-def build_html_from_template_data(template_id, data):
+def send_template_emails_batch(emails):
     """
-    Build HTML email from template data.
+    Send many template emails through Resend's batch endpoint.
+
+    Emails are sent in chunks of RESEND_BATCH_SIZE, one API call per chunk.
+    Resend's batch endpoint doesn't accept attachments, so emails carrying
+    attachments are sent one at a time via send_template_email.
 
     Args:
-        template_id: Template identifier
-        data: Dict of template variables
+        emails: List of dicts of send_template_email arguments
 
     Returns:
-        str: Rendered HTML content
+        list: Message IDs, in the same order as emails
+
+    Raises:
+        ResendError: On API failure
     """
-    company_name = data.get("company_name", "")
-    customer_name = data.get("customer_name", "")
-    document_type = data.get("document_type", "Document")
-    document_number = data.get("document_number", "")
-    document_date = data.get("document_date", "")
-    total_amount = data.get("total_amount", "")
-    due_date = data.get("due_date", "")
-    custom_message = data.get("custom_message", "")
-
-    html = f"""
-<!DOCTYPE html>
-<html>
-<head>
-    <meta charset="utf-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>{document_type} from {company_name}</title>
-</head>
-<body style="font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, 'Helvetica Neue', Arial, sans-serif; line-height: 1.6; color: #333; max-width: 600px; margin: 0 auto; padding: 20px;">
-    <div style="background-color: #f8f9fa; padding: 30px; border-radius: 8px;">
-        <h2 style="color: #2c3e50; margin-top: 0;">{document_type} from {company_name}</h2>
+    settings = frappe.get_cached_doc("Email Service Settings")
+    api_key = get_api_key(settings)
+
+    message_ids = [None] * len(emails)
+    batch = []
+    for idx, email in enumerate(emails):
+        if email.get("attachments"):
+            message_ids[idx] = send_template_email(**email).get("message_id")
+        else:
+            batch.append((idx, _build_template_payload(settings, **email)))
 
-        <p>Hi {customer_name},</p>
+    _send_batch(settings, api_key, batch, message_ids)
 
-        <p>Please find your {document_type.lower()} details below:</p>
+    return message_ids
 
-        <table style="width: 100%; border-collapse: collapse; margin: 20px 0;">
-            <tr>
-                <td style="padding: 10px; border-bottom: 1px solid #dee2e6;"><strong>{document_type} Number:</strong></td>
-                <td style="padding: 10px; border-bottom: 1px solid #dee2e6;">{document_number}</td>
-            </tr>
-            <tr>
-                <td style="padding: 10px; border-bottom: 1px solid #dee2e6;"><strong>Date:</strong></td>
-                <td style="padding: 10px; border-bottom: 1px solid #dee2e6;">{document_date}</td>
-            </tr>
-            {"<tr><td style='padding: 10px; border-bottom: 1px solid #dee2e6;'><strong>Due Date:</strong></td><td style='padding: 10px; border-bottom: 1px solid #dee2e6;'>" + due_date + "</td></tr>" if due_date else ""}
-            <tr>
-                <td style="padding: 10px; border-bottom: 1px solid #dee2e6;"><strong>Total Amount:</strong></td>
-                <td style="padding: 10px; border-bottom: 1px solid #dee2e6; font-size: 18px; color: #2c3e50;"><strong>{total_amount}</strong></td>
-            </tr>
-        </table>
-
-        {f"<p>{custom_message}</p>" if custom_message else ""}
 
-        <p>Please find the detailed {document_type.lower()} attached as a PDF.</p>
+def build_html_from_template_data(template_id, data):
+    """
+    Build HTML email from template data.
 
-        <hr style="border: none; border-top: 1px solid #dee2e6; margin: 30px 0;">
+    Args:
+        template_id: Template identifier
+        data: Dict of template variables
 
-        <p style="color: #6c757d; font-size: 14px;">
-            Best regards,<br>
-            <strong>{company_name}</strong>
-        </p>
-    </div>
-</body>
-</html>
-"""
-    return html
+    Returns:
+        str: Rendered HTML content
+    """
+    return _FALLBACK_HTML_TEMPLATE.render(
+        company_name=data.get("company_name", ""),
+        customer_name=data.get("customer_name", ""),
+        document_type=data.get("document_type", "Document"),
+        document_number=data.get("document_number", ""),
+        document_date=data.get("document_date", ""),
+        total_amount=data.get("total_amount", ""),
+        due_date=data.get("due_date", ""),
+        custom_message=data.get("custom_message", ""),
+    )
 
 
 def test_connection():
     """
     Test Resend API connection.
 
+    A successful result is cached for five minutes and cleared when Email
+    Service Settings is saved, so repeated health checks don't each call Resend.
+
     Returns:
         dict: Success status and message
     """
+    result = frappe.cache().get_value(RESEND_CONNECTION_CACHE_KEY, expires=True)
+    if result is None:
+        result = _test_connection()
+        if result["success"]:
+            frappe.cache().set_value(RESEND_CONNECTION_CACHE_KEY, result, expires_in_sec=300)
+
+    return result
+
+
+def _test_connection():
+    """Call the Resend API to check the configured key."""
     try:
         api_key = get_api_key()
 
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        }
+        headers = _api_headers(api_key)
 
-        response = requests.get(
+        response = get_session().get(
             "https://api.resend.com/domains",
             headers=headers,
             timeout=10
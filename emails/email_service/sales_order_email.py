@@ -7,18 +7,39 @@ from emails.email_service.utils import (
     get_company_info,
     get_customer_primary_email,
     format_currency_amount,
-    get_document_pdf,
-    pdf_to_base64,
+    get_document_pdf_attachment,
     create_communication_log,
-    get_document_link,
+    log_sent_communication,
+    get_common_template_data,
+    get_email_tags,
+    get_items_summary,
 )
 
+# Sales Order fields used to build the email, read instead of the whole document
+_SALES_ORDER_FIELDS = (
+    "docstatus",
+    "customer",
+    "customer_name",
+    "company",
+    "transaction_date",
+    "delivery_date",
+    "grand_total",
+    "currency",
+    "po_no",
+    "shipping_address_name",
+)
+
+# Address fields read by get_formatted_address
+_ADDRESS_FIELDS = ("address_line1", "address_line2", "city", "state", "pincode", "country")
 
-def send_sales_order_email(sales_order_name, to_email=None, cc=None, bcc=None, custom_message=None, skip_communication=False):
+
+def send_sales_order_email(sales_order_name, to_email=None, cc=None, bcc=None, custom_message=None, skip_communication=False, attach_pdf=None):
     """Send Sales Order confirmation email via Resend."""
     settings = get_email_settings()
 
-    sales_order = frappe.get_doc("Sales Order", sales_order_name)
+    sales_order = frappe.db.get_value("Sales Order", sales_order_name, _SALES_ORDER_FIELDS, as_dict=True)
+    if not sales_order:
+        frappe.throw(f"Sales Order {sales_order_name} not found", frappe.DoesNotExistError)
 
     if sales_order.docstatus != 1:
         frappe.throw(f"Sales Order {sales_order_name} must be submitted before sending email")
@@ -33,53 +54,42 @@ def send_sales_order_email(sales_order_name, to_email=None, cc=None, bcc=None, c
 
     template_id = settings.sales_order_template_id or ""
 
+    order_date = formatdate(sales_order.transaction_date)
+
     template_data = {
         "document_type": "Sales Order",
         "customer_name": sales_order.customer_name or sales_order.customer,
-        "sales_order_number": sales_order.name,
-        "document_number": sales_order.name,
-        "order_date": formatdate(sales_order.transaction_date),
-        "document_date": formatdate(sales_order.transaction_date),
+        "sales_order_number": sales_order_name,
+        "document_number": sales_order_name,
+        "order_date": order_date,
+        "document_date": order_date,
         "delivery_date": formatdate(sales_order.delivery_date) if sales_order.delivery_date else "",
         "total_amount": format_currency_amount(sales_order.grand_total, sales_order.currency),
         "currency": sales_order.currency,
-        "company_name": company_info["company_name"],
-        "company_logo": company_info["company_logo"] or "",
-        "company_address": company_info["company_address"] or "",
-        "company_phone": company_info["phone"] or "",
-        "company_email": company_info["email"] or "",
-        "document_link": get_document_link("Sales Order", sales_order_name),
-        "custom_message": custom_message or "",
-        "subject": f"Order Confirmation {sales_order.name} - {company_info['company_name']}",
+        **get_common_template_data("Sales Order", sales_order_name, company_info, custom_message),
+        "subject": f"Order Confirmation {sales_order_name} - {company_info['company_name']}",
         "po_no": sales_order.po_no or "",
     }
 
+    shipping_address = None
     if sales_order.shipping_address_name:
-        shipping_address = frappe.get_doc("Address", sales_order.shipping_address_name)
-        template_data["shipping_address"] = get_formatted_address(shipping_address)
-    else:
-        template_data["shipping_address"] = ""
-
-    items_summary = []
-    for item in sales_order.items[:5]:
-        items_summary.append({
-            "item_name": item.item_name,
-            "qty": item.qty,
-            "rate": format_currency_amount(item.rate, sales_order.currency),
-            "amount": format_currency_amount(item.amount, sales_order.currency),
-        })
-    template_data["items"] = items_summary
-    template_data["items_count"] = len(sales_order.items)
+        shipping_address = frappe.db.get_value(
+            "Address", sales_order.shipping_address_name, _ADDRESS_FIELDS, as_dict=True
+        )
+    template_data["shipping_address"] = (
+        get_formatted_address(shipping_address) if shipping_address else ""
+    )
 
-    try:
-        pdf_bytes, filename = get_document_pdf("Sales Order", sales_order_name)
-        attachments = [{
-            "filename": filename,
-            "content": pdf_to_base64(pdf_bytes)
-        }]
-    except Exception as e:
-        frappe.log_error(title="Sales Order PDF Generation Failed", message=str(e))
-        attachments = None
+    template_data["items"], template_data["items_count"] = get_items_summary(
+        "Sales Order Item", sales_order_name, sales_order.currency
+    )
+
+    attachments = None
+    if settings.should_attach_pdf("Sales Order", attach_pdf):
+        try:
+            attachments = [get_document_pdf_attachment("Sales Order", sales_order_name, settings=settings)]
+        except Exception as e:
+            frappe.log_error(title="Sales Order PDF Generation Failed", message=str(e))
 
     try:
         result = send_template_email(
@@ -90,14 +100,11 @@ def send_sales_order_email(sales_order_name, to_email=None, cc=None, bcc=None, c
             cc=cc,
             bcc=bcc,
             attachments=attachments,
-            tags=[
-                {"name": "doctype", "value": "sales_order"},
-                {"name": "document", "value": sales_order_name.replace("-", "_").replace(" ", "_")}
-            ]
+            tags=get_email_tags("Sales Order", sales_order_name)
         )
 
         if not skip_communication:
-            create_communication_log(
+            log_sent_communication(
                 doctype="Sales Order",
                 docname=sales_order_name,
                 recipient=to_email,
@@ -130,7 +137,7 @@ def send_sales_order_email(sales_order_name, to_email=None, cc=None, bcc=None, c
 
 
 def get_formatted_address(address):
-    """Format address for display."""
+    """Format address (an Address doc or a dict of _ADDRESS_FIELDS) for display."""
     parts = []
     if address.address_line1:
         parts.append(address.address_line1)
@@ -1,24 +1,217 @@
 import base64
+from functools import lru_cache
+
 import frappe
 from frappe.utils import get_url, formatdate, fmt_money
+from frappe.utils.caching import request_cache
+
+# Redis cache keys derived from Email Service Settings
+RESEND_STATUS_CACHE_KEY = "emails:resend_status"
+RESEND_CONNECTION_CACHE_KEY = "emails:resend_connection"
+UNSUPPORTED_DOCTYPES_CACHE_KEY = "emails:unsupported_doctypes"
+UNSUPPORTED_DOCTYPES_CACHE_TTL = 300
+CONFIGURED_DOCTYPES_CACHE_KEY = "emails:configured_doctypes"
+PDF_CACHE_KEY = "emails:pdf"
+PDF_CACHE_TTL = 24 * 60 * 60
+
+# Emails a bulk send hands to Resend before its failure rate can abort it
+BULK_ABORT_MIN_ATTEMPTS = 30
+
+# Largest base64 PDF kept in Redis by get_document_pdf_attachment
+_PDF_CACHE_MAX_SIZE = 2 * 1024 * 1024
+
+# Fields checked, in order, for a party's email by get_generic_party_email
+_PARTY_EMAIL_FIELDS = ("email_id", "email", "contact_email", "primary_email", "email_address")
+
+# Best email of a Contact linked to a party: the contact's own email_id, else
+# its primary (or first) Contact Email row
+_PARTY_CONTACT_EMAIL_SQL = """
+    select c.email_id, ce.email_id as row_email_id
+    from `tabDynamic Link` dl
+    join `tabContact` c on c.name = dl.parent
+    left join `tabContact Email` ce
+        on ce.parent = c.name and ce.parenttype = 'Contact'
+    where dl.link_doctype = %s and dl.link_name = %s and dl.parenttype = 'Contact'
+    order by (c.email_id is not null and c.email_id != '') desc,
+        ce.is_primary desc, ce.idx
+    limit 1
+"""
+
+# Company fields read by get_company_info
+_COMPANY_FIELDS = ("company_name", "company_logo", "phone_no", "email", "website", "tax_id")
+
+# Address linked to a company, as used by get_company_address
+_COMPANY_ADDRESS_SQL = """
+    select a.address_line1, a.address_line2, a.city, a.state, a.pincode, a.country
+    from `tabAddress` a
+    join `tabDynamic Link` dl on dl.parent = a.name
+    where dl.link_doctype = 'Company' and dl.link_name = %s and dl.parenttype = 'Address'
+    limit 1
+"""
+
+# A doctype's default print format: the Property Setter override, else its
+# first enabled Print Format
+_DEFAULT_PRINT_FORMAT_SQL = """
+    select coalesce(
+        (select nullif(value, '') from `tabProperty Setter`
+            where doc_type = %s and property = 'default_print_format' limit 1),
+        (select name from `tabPrint Format`
+            where doc_type = %s and disabled = 0 limit 1)
+    )
+"""
+
+# Characters in a document name that aren't allowed in a Resend tag value
+_TAG_VALUE_TABLE = str.maketrans({"-": "_", " ": "_"})
+
+
+def clear_email_settings_cache():
+    """Drop cached values derived from Email Service Settings."""
+    frappe.clear_document_cache("Email Service Settings", "Email Service Settings")
+    cache = frappe.cache()
+    cache.delete_value(
+        [
+            RESEND_STATUS_CACHE_KEY,
+            RESEND_CONNECTION_CACHE_KEY,
+            CONFIGURED_DOCTYPES_CACHE_KEY,
+        ]
+    )
+    cache.delete_keys(f"{UNSUPPORTED_DOCTYPES_CACHE_KEY}:")
+
+
+def is_doctype_configured(doctype, settings=None):
+    """
+    Check if a doctype is configured for Resend emails.
+
+    Doctypes found to be unsupported are remembered in Redis for a few minutes
+    (or until the settings are saved), so the many emails that never go through
+    Resend skip the settings lookup.
+    """
+    # One key per doctype, so each entry expires on its own schedule
+    cache = frappe.cache()
+    key = f"{UNSUPPORTED_DOCTYPES_CACHE_KEY}:{doctype}"
+    if cache.get_value(key):
+        return False
+
+    settings = settings or frappe.get_cached_doc("Email Service Settings")
+    if settings.is_doctype_supported(doctype):
+        return True
+
+    cache.set_value(key, 1, expires_in_sec=UNSUPPORTED_DOCTYPES_CACHE_TTL)
+    return False
+
+
+@request_cache
+def get_resend_api_key():
+    """
+    Get the decrypted Resend API key.
+
+    Memoized per request/job: the settings doc is cached, but decrypting the
+    password is a database read every time.
+    """
+    return frappe.get_cached_doc("Email Service Settings").get_password("resend_api_key")
 
 
 def get_email_settings():
-    """Get Email Service Settings document."""
-    settings = frappe.get_single("Email Service Settings")
+    """Get Email Service Settings document (cached until the settings are saved)."""
+    settings = frappe.get_cached_doc("Email Service Settings")
 
     if not settings.enabled:
         frappe.throw("Email Service is not enabled. Please enable it in Email Service Settings.")
 
-    if not settings.get_password("resend_api_key"):
+    if not get_resend_api_key():
         frappe.throw("Resend API Key not configured in Email Service Settings.")
 
     return settings
 
 
+def log_send_error(title, message, sample=True):
+    """
+    Record an Error Log entry from the email send path.
+
+    Inside background jobs entries are buffered on frappe.local and written with
+    a single bulk insert once the job finishes, so a failure storm during a bulk
+    send doesn't cost an insert per failed email. Only the 1st, 2nd, 4th, 8th...
+    occurrence of each title is kept; the rest are summarised in one entry with
+    the last message. Pass sample=False for records that must all be kept (e.g.
+    Log All Attempts); they are still buffered. Elsewhere this is
+    frappe.log_error.
+    """
+    job = getattr(frappe.local, "job", None)
+    if not job or not getattr(job, "after_job", None):
+        frappe.log_error(title=title, message=message)
+        return
+
+    buffer = getattr(frappe.local, "emails_error_logs", None)
+    if buffer is None:
+        buffer = frappe.local.emails_error_logs = {"entries": [], "counts": {}, "last": {}}
+        job.after_job.add(_flush_send_errors)
+
+    if not sample:
+        buffer["entries"].append((title, message))
+        return
+
+    count = buffer["counts"][title] = buffer["counts"].get(title, 0) + 1
+    if count & (count - 1) == 0:
+        buffer["entries"].append((title, message))
+    else:
+        buffer["last"][title] = message
+
+
+def _flush_send_errors():
+    """Write Error Log entries buffered by log_send_error."""
+    buffer = getattr(frappe.local, "emails_error_logs", None)
+    frappe.local.emails_error_logs = None
+
+    if not buffer:
+        return
+
+    entries = buffer["entries"]
+    for title, message in buffer["last"].items():
+        # Occurrences at powers of two were logged individually
+        count = buffer["counts"][title]
+        suppressed = count - count.bit_length()
+        entries.append(
+            (
+                f"{title} ({suppressed} more)",
+                f"{suppressed} further occurrences were not logged individually.\n"
+                f"Last error:\n{message}",
+            )
+        )
+
+    now = frappe.utils.now()
+    user = frappe.session.user
+    frappe.db.bulk_insert(
+        "Error Log",
+        ["name", "creation", "modified", "owner", "modified_by", "method", "error", "seen"],
+        [
+            [frappe.generate_hash(length=10), now, now, user, user, title, message, 0]
+            for title, message in entries
+        ],
+    )
+    frappe.db.commit()
+
+
+def bulk_send_failing(send_failures, attempts):
+    """
+    Check if a bulk send should stop because Resend appears to be down.
+
+    Only emails Resend failed to take count, not documents that couldn't be
+    prepared, and only once enough emails were tried for the rate to mean much.
+    """
+    return attempts >= BULK_ABORT_MIN_ATTEMPTS and send_failures * 3 > attempts
+
+
+@request_cache
 def get_company_info(company_name):
-    """Get company information for email templates."""
-    company = frappe.get_doc("Company", company_name)
+    """
+    Get company information for email templates.
+
+    Cached for the request (or background job), so a bulk send for one company
+    loads it once. Callers must not modify the returned dict.
+    """
+    company = frappe.db.get_value("Company", company_name, _COMPANY_FIELDS, as_dict=True)
+    if not company:
+        frappe.throw(f"Company {company_name} not found", frappe.DoesNotExistError)
 
     logo_url = None
     if company.company_logo:
@@ -39,16 +232,11 @@ def get_company_info(company_name):
 
 def get_company_address(company_name):
     """Get formatted company address."""
-    address_name = frappe.db.get_value(
-        "Dynamic Link",
-        {"link_doctype": "Company", "link_name": company_name, "parenttype": "Address"},
-        "parent"
-    )
-
-    if not address_name:
+    address = frappe.db.sql(_COMPANY_ADDRESS_SQL, company_name, as_dict=True)
+    if not address:
         return ""
 
-    address = frappe.get_doc("Address", address_name)
+    address = address[0]
     parts = []
 
     if address.address_line1:
@@ -68,60 +256,74 @@ def get_company_address(company_name):
     return "\n".join(parts)
 
 
+@request_cache
 def get_customer_primary_email(customer_name):
     """Get primary email address for a customer."""
-    customer = frappe.get_doc("Customer", customer_name)
+    email = frappe.db.get_value("Customer", customer_name, "email_id")
+    return email or get_party_contact_email("Customer", customer_name)
 
-    if customer.email_id:
-        return customer.email_id
 
-    contact_name = frappe.db.get_value(
-        "Dynamic Link",
-        {
-            "link_doctype": "Customer",
-            "link_name": customer_name,
-            "parenttype": "Contact"
-        },
-        "parent"
-    )
+@request_cache
+def get_supplier_primary_email(supplier_name):
+    """Get primary email address for a supplier."""
+    email = frappe.db.get_value("Supplier", supplier_name, "email_id")
+    return email or get_party_contact_email("Supplier", supplier_name)
 
-    if contact_name:
-        contact = frappe.get_doc("Contact", contact_name)
-        if contact.email_id:
-            return contact.email_id
 
-        if contact.email_ids:
-            for email in contact.email_ids:
-                if email.is_primary:
-                    return email.email_id
-            return contact.email_ids[0].email_id
+def get_party_contact_email(doctype, party_name):
+    """
+    Get the best email of a Contact linked to a party, in a single query.
+
+    Prefers a contact's own email_id, then its primary (or first) Contact Email row.
+    """
+    contact = frappe.db.sql(_PARTY_CONTACT_EMAIL_SQL, (doctype, party_name), as_dict=True)
+    if contact:
+        return contact[0].email_id or contact[0].row_email_id
 
     return None
 
 
-def get_supplier_primary_email(supplier_name):
-    """Get primary email address for a supplier."""
-    supplier = frappe.get_doc("Supplier", supplier_name)
+def get_common_template_data(doctype, docname, company_info, custom_message=None):
+    """Get the template variables shared by every document email."""
+    return {
+        "company_name": company_info.get("company_name") or "",
+        "company_logo": company_info.get("company_logo") or "",
+        "company_address": company_info.get("company_address") or "",
+        "company_phone": company_info.get("phone") or "",
+        "company_email": company_info.get("email") or "",
+        "document_link": get_document_link(doctype, docname),
+        "custom_message": custom_message or "",
+    }
 
-    if supplier.email_id:
-        return supplier.email_id
 
-    contact_name = frappe.db.get_value(
-        "Dynamic Link",
-        {
-            "link_doctype": "Supplier",
-            "link_name": supplier_name,
-            "parenttype": "Contact"
-        },
-        "parent"
-    )
+def get_items_summary(item_doctype, parent, currency, limit=5):
+    """
+    Get the first few item rows of a document, formatted for an email.
 
-    if contact_name:
-        contact = frappe.get_doc("Contact", contact_name)
-        if contact.email_id:
-            return contact.email_id
+    Only the summarised rows are read, rather than loading the whole document
+    with every child table.
 
-    return None
+    Returns:
+        tuple: List of item dicts and the document's total item count
+    """
+    items = frappe.get_all(
+        item_doctype,
+        filters={"parent": parent, "parentfield": "items"},
+        fields=["item_name", "qty", "rate", "amount"],
+        order_by="idx",
+        limit=limit,
+    )
+    items_count = frappe.db.count(item_doctype, {"parent": parent, "parentfield": "items"})
+
+    return [
+        {
+            "item_name": item.item_name,
+            "qty": item.qty,
+            "rate": format_currency_amount(item.rate, currency),
+            "amount": format_currency_amount(item.amount, currency),
+        }
+        for item in items
+    ], items_count
 
 
 def format_currency_amount(amount, currency="USD"):
@@ -136,9 +338,25 @@ def format_date(date, format_string=None):
     return formatdate(date, format_string)
 
 
+@lru_cache(maxsize=256)
+def _scrub_doctype(doctype):
+    """Scrubbed doctype name; the set of doctypes is small, so keep them around."""
+    return frappe.scrub(doctype)
+
+
+@request_cache
+def _base_url():
+    """
+    Site URL, read once per request/job.
+
+    Not lru_cache'd: the URL differs between sites served by the same worker.
+    """
+    return get_url()
+
+
 def get_document_link(doctype, docname):
     """Get full URL to document in ERPNext."""
-    return f"{get_url()}/app/{frappe.scrub(doctype)}/{docname}"
+    return f"{_base_url()}/app/{_scrub_doctype(doctype)}/{docname}"
 
 
 def get_absolute_url(relative_url):
@@ -149,15 +367,24 @@ def get_absolute_url(relative_url):
     if relative_url.startswith(("http://", "https://")):
         return relative_url
 
-    base_url = get_url()
+    base_url = _base_url()
     if relative_url.startswith("/"):
         return f"{base_url}{relative_url}"
     return f"{base_url}/{relative_url}"
 
 
+def get_email_tags(doctype, docname):
+    """Build the Resend tags identifying the document an email was sent for."""
+    return [
+        {"name": "doctype", "value": _scrub_doctype(doctype)},
+        {"name": "document", "value": docname.translate(_TAG_VALUE_TABLE)},
+    ]
+
+
 def pdf_to_base64(pdf_bytes):
     """Convert PDF bytes to base64 string."""
-    return base64.b64encode(pdf_bytes).decode("utf-8")
+    # Base64 output is pure ASCII, which takes CPython's fast decode path
+    return base64.b64encode(pdf_bytes).decode("ascii")
 
 
 def get_document_pdf(doctype, docname, print_format=None):
@@ -169,11 +396,41 @@ def get_document_pdf(doctype, docname, print_format=None):
         as_pdf=True
     )
 
-    filename = f"{frappe.scrub(doctype)}_{docname}.pdf".replace(" ", "_")
+    filename = f"{_scrub_doctype(doctype)}_{docname}.pdf".replace(" ", "_")
 
     return pdf_bytes, filename
 
 
+def get_document_pdf_attachment(doctype, docname, print_format=None, settings=None):
+    """
+    Build the Resend attachment for a document's PDF.
+
+    With Cache Submitted PDFs enabled, the base64 PDF of a submitted document is
+    kept in Redis for a day, keyed by its modified timestamp, so emailing it
+    again skips the print renderer.
+    """
+    settings = settings or frappe.get_cached_doc("Email Service Settings")
+
+    key = None
+    if settings.cache_submitted_pdfs:
+        docstatus, modified = frappe.db.get_value(
+            doctype, docname, ["docstatus", "modified"]
+        ) or (None, None)
+        if docstatus == 1:
+            key = f"{PDF_CACHE_KEY}:{doctype}:{docname}:{print_format or ''}:{modified}"
+            attachment = frappe.cache().get_value(key)
+            if attachment:
+                return attachment
+
+    pdf_bytes, filename = get_document_pdf(doctype, docname, print_format)
+    attachment = {"filename": filename, "content": pdf_to_base64(pdf_bytes)}
+
+    if key and len(attachment["content"]) <= _PDF_CACHE_MAX_SIZE:
+        frappe.cache().set_value(key, attachment, expires_in_sec=PDF_CACHE_TTL)
+
+    return attachment
+
+
 def create_communication_log(
     doctype,
     docname,
@@ -186,102 +443,169 @@ def create_communication_log(
     sender=None
 ):
     """Create Communication document to log email."""
-    settings = frappe.get_single("Email Service Settings")
-
-    comm = frappe.get_doc({
-        "doctype": "Communication",
-        "communication_type": "Communication",
-        "communication_medium": "Email",
-        "sent_or_received": "Sent",
-        "subject": subject,
-        "content": content,
-        "sender": sender or settings.default_sender_email,
-        "recipients": recipient,
-        "reference_doctype": doctype,
-        "reference_name": docname,
-        "status": "Linked" if status == "Sent" else "Open",
-        "email_status": "Open",
-    })
+    settings = frappe.get_cached_doc("Email Service Settings")
+
+    comm = frappe.new_doc("Communication")
+    comm.communication_type = "Communication"
+    comm.communication_medium = "Email"
+    comm.sent_or_received = "Sent"
+    comm.subject = subject
+    comm.content = content
+    comm.sender = sender or settings.default_sender_email
+    comm.recipients = recipient
+    comm.reference_doctype = doctype
+    comm.reference_name = docname
+    comm.status = "Linked" if status == "Sent" else "Open"
+    comm.email_status = "Open"
+
+    # The reference document was just loaded by the sender, so its link
+    # doesn't need checking again
+    comm.flags.ignore_links = True
 
     if message_id:
         comm.message_id = message_id
 
+    comm.insert(ignore_permissions=True)
+
+    # Added once inserted, so the comment is linked to the Communication's name
     if error_msg and status != "Sent":
         comm.add_comment("Comment", f"Email send failed: {error_msg}")
 
-    comm.insert(ignore_permissions=True)
-    frappe.db.commit()
+    # Successful sends are committed with the rest of the request or job. A
+    # failure log is usually followed by a raise that rolls the transaction
+    # back, so it is committed straight away to survive that.
+    if status != "Sent":
+        frappe.db.commit()
 
     return comm
 
 
-def get_print_format_for_doctype(doctype):
-    """Get default print format for a doctype."""
-    default_format = frappe.db.get_value(
-        "Property Setter",
-        {
-            "doc_type": doctype,
-            "property": "default_print_format"
-        },
-        "value"
+def log_sent_communication(**kwargs):
+    """
+    Log a successful send, deferring the insert when called from a web request.
+
+    Background jobs (the usual caller) and tests write the Communication
+    inline. Failure logs are never deferred: they must be committed before
+    the error is re-raised and the transaction rolled back.
+    """
+    if getattr(frappe.local, "job", None) or frappe.flags.in_test:
+        create_communication_log(**kwargs)
+        return
+
+    frappe.enqueue(
+        "emails.email_service.utils.create_communication_log",
+        queue="short",
+        enqueue_after_commit=True,
+        **kwargs,
     )
 
-    if default_format:
-        return default_format
 
-    print_format = frappe.db.get_value(
-        "Print Format",
-        {"doc_type": doctype, "disabled": 0},
-        "name"
-    )
+def bulk_create_communications(rows):
+    """
+    Insert many Communication rows with a single multi-row INSERT.
 
-    return print_format
+    Rows skip the Communication controller, so each dict must already hold the
+    final field values (e.g. those built by create_communication_log).
 
+    Args:
+        rows: List of dicts of Communication field values
 
-def get_email_recipients_from_doc(doc):
-    """Extract email recipients from a document."""
-    recipients = []
+    Returns:
+        list: Names of the inserted Communication rows
+    """
+    if not rows:
+        return []
+
+    now = frappe.utils.now()
+    user = frappe.session.user
+    base_fields = ["name", "creation", "modified", "owner", "modified_by", "communication_date"]
+    fields = sorted({field for row in rows for field in row} - set(base_fields))
+
+    names = []
+    values = []
+    for row in rows:
+        name = frappe.generate_hash(length=10)
+        names.append(name)
+        values.append(
+            [name, now, now, user, user, row.get("communication_date") or now]
+            + [row.get(field) for field in fields]
+        )
+
+    frappe.db.bulk_insert("Communication", base_fields + fields, values)
 
-    if hasattr(doc, "email_id") and doc.email_id:
-        recipients.append(doc.email_id)
+    return names
+
+
+@request_cache
+def get_print_format_for_doctype(doctype):
+    """Get default print format for a doctype."""
+    print_format = frappe.db.sql(_DEFAULT_PRINT_FORMAT_SQL, (doctype, doctype))
+    return print_format[0][0] if print_format else None
+
+
+def iter_email_recipients_from_doc(doc):
+    """
+    Yield a document's recipient emails in priority order.
 
-    if hasattr(doc, "contact_email") and doc.contact_email:
-        recipients.append(doc.contact_email)
+    Party emails are only looked up once the emails before them have been
+    consumed, so a caller taking the first recipient skips those queries.
+    """
+    # Payment Request carries its recipient directly
+    if doc.doctype == "Payment Request":
+        if doc.get("email_to"):
+            yield doc.email_to
+        return
+
+    if getattr(doc, "email_id", None):
+        yield doc.email_id
+
+    if getattr(doc, "contact_email", None):
+        yield doc.contact_email
+
+    # Payment Entry links its party dynamically through party_type
+    if doc.doctype == "Payment Entry":
+        if doc.get("party_type") and doc.get("party"):
+            email = get_party_email_by_doctype(doc.party_type, doc.party)
+            if email:
+                yield email
+        return
 
-    if hasattr(doc, "customer") and doc.customer:
+    if getattr(doc, "customer", None):
         email = get_customer_primary_email(doc.customer)
         if email:
-            recipients.append(email)
+            yield email
 
-    if hasattr(doc, "supplier") and doc.supplier:
+    if getattr(doc, "supplier", None):
         email = get_supplier_primary_email(doc.supplier)
         if email:
-            recipients.append(email)
+            yield email
 
-    seen = set()
-    unique_recipients = []
-    for email in recipients:
-        if email and email not in seen:
-            seen.add(email)
-            unique_recipients.append(email)
 
-    return unique_recipients
+def get_email_recipients_from_doc(doc):
+    """Extract email recipients from a document."""
+    # dict.fromkeys drops duplicates while keeping the priority order
+    return list(dict.fromkeys(iter_email_recipients_from_doc(doc)))
 
 
+@request_cache
 def should_use_resend(doctype):
-    """Check if Resend should be used for a given doctype."""
-    try:
-        settings = frappe.get_single("Email Service Settings")
+    """
+    Check if Resend should be used for a given doctype.
 
-        if not settings.enabled:
+    Memoized per request/job, since the API key check decrypts the password.
+    """
+    try:
+        # Check if doctype is supported via child table or legacy config. This
+        # comes first: known unsupported doctypes are answered from Redis
+        # without the settings doc.
+        if not is_doctype_configured(doctype):
             return False
 
-        # Check if API key is configured
-        if not settings.get_password("resend_api_key"):
+        if not frappe.get_cached_doc("Email Service Settings").enabled:
             return False
 
-        # Check if doctype is supported via child table or legacy config
-        return settings.is_doctype_supported(doctype)
+        # Check if API key is configured
+        return bool(get_resend_api_key())
 
     except Exception:
         return False
@@ -319,32 +643,17 @@ def get_generic_party_email(doctype, party_name):
         str: Email address or None
     """
     try:
-        party = frappe.get_doc(doctype, party_name)
-
-        # Try common email field names
-        for field in ["email_id", "email", "contact_email", "primary_email", "email_address"]:
-            email = getattr(party, field, None)
-            if email:
-                return email
+        # Try common email field names, reading only the columns this doctype has
+        meta = frappe.get_meta(doctype)
+        fields = [field for field in _PARTY_EMAIL_FIELDS if meta.has_field(field)]
+        if fields:
+            party = frappe.db.get_value(doctype, party_name, fields, as_dict=True) or {}
+            for field in fields:
+                if party.get(field):
+                    return party[field]
 
         # Try to find via Contact link
-        contact_name = frappe.db.get_value(
-            "Dynamic Link",
-            {"link_doctype": doctype, "link_name": party_name, "parenttype": "Contact"},
-            "parent",
-        )
-
-        if contact_name:
-            contact = frappe.get_doc("Contact", contact_name)
-            if contact.email_id:
-                return contact.email_id
-
-            # Check email_ids child table
-            if contact.email_ids:
-                for email_row in contact.email_ids:
-                    if email_row.is_primary:
-                        return email_row.email_id
-                return contact.email_ids[0].email_id
+        return get_party_contact_email(doctype, party_name)
 
     except Exception:
         pass
@@ -7,6 +7,11 @@ Handles webhook events from Resend for email tracking (delivered, opened, clicke
 import frappe
 import json
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 
 @frappe.whitelist(allow_guest=True)
 def handle_resend_webhook():
@@ -29,16 +34,18 @@ def handle_resend_webhook():
             frappe.log_error(title="Resend Webhook", message="Empty payload received")
             return {"status": "error", "message": "Empty payload"}
 
-        data = json.loads(payload)
+        # orjson's JSONDecodeError subclasses json's, so the handler below
+        # catches both
+        data = orjson.loads(payload) if orjson else json.loads(payload)
 
         event_type = data.get("type")
         event_data = data.get("data", {})
 
         # Log for debugging
-        if frappe.get_single("Email Service Settings").log_all_attempts:
+        if frappe.get_cached_doc("Email Service Settings").log_all_attempts:
             frappe.log_error(
                 title=f"Resend Webhook: {event_type}",
-                message=json.dumps(data, indent=2)
+                message=_dump_for_log(data)
             )
 
         # Get the email ID from Resend
@@ -47,21 +54,15 @@ def handle_resend_webhook():
         if not email_id:
             return {"status": "ok", "message": "No email_id in event"}
 
-        # Find the Communication with this message_id
+        # Find the Communication with this message_id. Resend IDs are stored
+        # as returned (no angle brackets), so an exact match can use Frappe's
+        # message_id index.
         comm_name = frappe.db.get_value(
             "Communication",
             {"message_id": email_id},
             "name"
         )
 
-        if not comm_name:
-            # Try without the angle brackets
-            comm_name = frappe.db.get_value(
-                "Communication",
-                {"message_id": ["like", f"%{email_id}%"]},
-                "name"
-            )
-
         if not comm_name:
             return {"status": "ok", "message": "Communication not found"}
 
@@ -70,22 +71,21 @@ def handle_resend_webhook():
             update_communication_status(comm_name, "delivered")
 
         elif event_type == "email.opened":
-            update_communication_status(comm_name, "opened")
-            mark_communication_as_read(comm_name)
+            update_communication_status(comm_name, "opened", mark_read=True)
 
         elif event_type == "email.clicked":
-            update_communication_status(comm_name, "clicked")
-            mark_communication_as_read(comm_name)
+            update_communication_status(comm_name, "clicked", mark_read=True)
 
         elif event_type == "email.bounced":
             update_communication_status(comm_name, "bounced")
-            add_communication_comment(comm_name, f"Email bounced: {event_data.get('bounce', {}).get('message', 'Unknown reason')}")
+            enqueue_communication_comment(comm_name, f"Email bounced: {event_data.get('bounce', {}).get('message', 'Unknown reason')}")
 
         elif event_type == "email.complained":
             update_communication_status(comm_name, "complained")
-            add_communication_comment(comm_name, "Recipient marked email as spam")
+            enqueue_communication_comment(comm_name, "Recipient marked email as spam")
 
-        frappe.db.commit()
+        # No explicit commit: Frappe commits the POST request's transaction
+        # once the handler returns
 
         return {"status": "ok"}
 
@@ -97,31 +97,48 @@ def handle_resend_webhook():
         return {"status": "error", "message": str(e)}
 
 
-def update_communication_status(comm_name, status):
-    """Update communication with delivery status."""
-    frappe.db.set_value(
-        "Communication",
-        comm_name,
-        "delivery_status",
-        status.title(),
-        update_modified=False
-    )
+def update_communication_status(comm_name, status, mark_read=False):
+    """Update communication with delivery status, optionally marking it read/seen."""
+    values = {"delivery_status": status.title()}
+    if mark_read:
+        values["read_by_recipient"] = 1
+        values["read_by_recipient_on"] = frappe.utils.now()
 
+    # Single UPDATE - the Communication is never loaded
+    frappe.db.set_value("Communication", comm_name, values, update_modified=False)
 
-def mark_communication_as_read(comm_name):
-    """Mark communication as read/seen."""
-    frappe.db.set_value(
-        "Communication",
-        comm_name,
-        {
-            "read_by_recipient": 1,
-            "read_by_recipient_on": frappe.utils.now()
-        },
-        update_modified=False
+
+def enqueue_communication_comment(comm_name, comment):
+    """
+    Add a comment to the communication from a background job.
+
+    Keeps the Comment insert off the webhook response, so Resend isn't kept
+    waiting and doesn't retry the event.
+    """
+    frappe.enqueue(
+        "emails.email_service.webhooks.add_communication_comment",
+        queue="short",
+        enqueue_after_commit=True,
+        comm_name=comm_name,
+        comment=comment,
     )
 
 
 def add_communication_comment(comm_name, comment):
     """Add a comment to the communication."""
-    comm = frappe.get_doc("Communication", comm_name)
-    comm.add_comment("Comment", comment)
+    frappe.get_doc(
+        {
+            "doctype": "Comment",
+            "comment_type": "Comment",
+            "reference_doctype": "Communication",
+            "reference_name": comm_name,
+            "content": comment,
+        }
+    ).insert(ignore_permissions=True)
+
+
+def _dump_for_log(data):
+    """Pretty-print a webhook payload for the Error Log."""
+    if orjson:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2).decode()
+    return json.dumps(data, indent=2)
@@ -29,7 +29,7 @@ class EmailDoctypeConfiguration(Document):
             module = meta.module
 
             # Get app from module
-            module_app = frappe.db.get_value("Module Def", module, "app_name")
+            module_app = frappe.get_cached_value("Module Def", module, "app_name")
             return module_app
         except Exception:
             return None
@@ -5,6 +5,8 @@ import frappe
 from frappe import _
 from frappe.model.document import Document
 
+from emails.email_service.utils import clear_email_settings_cache
+
 
 # Registry of known doctypes and their source apps with default configurations
 DOCTYPE_REGISTRY = {
@@ -80,6 +82,20 @@ DOCTYPE_REGISTRY = {
     },
 }
 
+# Doctypes that can still be enabled by the legacy template ID fields alone
+LEGACY_DOCTYPES = frozenset({"Sales Invoice", "Quotation", "Sales Order", "Payment Request"})
+
+# Legacy template ID field for each doctype (not every field still exists)
+LEGACY_TEMPLATE_FIELDS = {
+    "Sales Invoice": "invoice_template_id",
+    "Quotation": "quotation_template_id",
+    "Sales Order": "sales_order_template_id",
+    "Delivery Note": "delivery_note_template_id",
+    "Payment Entry": "receipt_template_id",
+    "Purchase Order": "purchase_order_template_id",
+    "Payment Request": "payment_request_template_id",
+}
+
 
 class EmailServiceSettings(Document):
     def validate(self):
@@ -97,12 +113,18 @@ class EmailServiceSettings(Document):
         # Validate doctype configurations
         self._validate_doctype_configurations()
 
+    def on_update(self):
+        """Invalidate cached copies of these settings used on the send path."""
+        clear_email_settings_cache()
+        self._doctype_config_map = None
+
     def _validate_doctype_configurations(self):
         """Validate that configured doctypes exist and their apps are installed."""
         if not self.supported_doctypes:
             return
 
         installed_apps = frappe.get_installed_apps()
+        existing = _get_existing_doctypes(row.doctype_name for row in self.supported_doctypes)
         warnings = []
 
         for row in self.supported_doctypes:
@@ -110,7 +132,7 @@ class EmailServiceSettings(Document):
                 continue
 
             # Check if doctype exists
-            if not frappe.db.exists("DocType", row.doctype_name):
+            if row.doctype_name not in existing:
                 if row.enabled:
                     warnings.append(
                         _("DocType '{0}' does not exist. Configuration will be disabled.").format(
@@ -149,39 +171,50 @@ class EmailServiceSettings(Document):
 
     def _get_legacy_template_id(self, doctype):
         """Fallback to old hardcoded fields for migration period."""
-        legacy_map = {
-            "Sales Invoice": getattr(self, "invoice_template_id", None),
-            "Quotation": self.quotation_template_id,
-            "Sales Order": self.sales_order_template_id,
-            "Delivery Note": getattr(self, "delivery_note_template_id", None),
-            "Payment Entry": getattr(self, "receipt_template_id", None),
-            "Purchase Order": getattr(self, "purchase_order_template_id", None),
-            "Payment Request": getattr(self, "payment_request_template_id", None),
-        }
-        return legacy_map.get(doctype)
+        fieldname = LEGACY_TEMPLATE_FIELDS.get(doctype)
+        return self.get(fieldname) if fieldname else None
+
+    def _get_doctype_config_map(self):
+        """
+        Map enabled doctype names to their configuration rows.
+
+        Built once per settings instance. The send path reads the cached settings
+        doc, so the child table is walked once per request instead of per lookup.
+        """
+        config_map = getattr(self, "_doctype_config_map", None)
+        if config_map is None:
+            config_map = {}
+            for row in self.supported_doctypes or []:
+                if row.enabled:
+                    config_map.setdefault(row.doctype_name, row)
+            self._doctype_config_map = config_map
+
+        return config_map
 
     def get_doctype_config(self, doctype):
         """Get full configuration for a doctype from the child table."""
-        if not self.supported_doctypes:
-            return None
+        return self._get_doctype_config_map().get(doctype)
 
-        for row in self.supported_doctypes:
-            if row.doctype_name == doctype and row.enabled:
-                return row
+    def should_attach_pdf(self, doctype, attach_pdf=None):
+        """
+        Check if emails for a doctype carry the document PDF (default: yes).
 
-        return None
+        An explicit attach_pdf from the caller overrides the configuration.
+        """
+        if attach_pdf is not None:
+            return bool(attach_pdf)
+
+        config = self.get_doctype_config(doctype)
+        return not config or bool(config.attach_pdf)
 
     def is_doctype_supported(self, doctype):
         """Check if a doctype is configured for Resend emails."""
         # Check child table first
-        if self.supported_doctypes:
-            for row in self.supported_doctypes:
-                if row.doctype_name == doctype and row.enabled:
-                    return True
+        if doctype in self._get_doctype_config_map():
+            return True
 
         # Fallback: check if doctype has legacy template configured
-        legacy_doctypes = ["Sales Invoice", "Quotation", "Sales Order", "Payment Request"]
-        if doctype in legacy_doctypes and self._get_legacy_template_id(doctype):
+        if doctype in LEGACY_DOCTYPES and self._get_legacy_template_id(doctype):
             return True
 
         return False
@@ -189,6 +222,8 @@ class EmailServiceSettings(Document):
     def get_available_doctypes(self):
         """Get list of doctypes available for email configuration based on installed apps."""
         installed_apps = frappe.get_installed_apps()
+        configured = {row.doctype_name for row in self.supported_doctypes or []}
+        existing = _get_existing_doctypes(DOCTYPE_REGISTRY)
         available = []
 
         for doctype, info in DOCTYPE_REGISTRY.items():
@@ -197,16 +232,9 @@ class EmailServiceSettings(Document):
                 continue
 
             # Check if the doctype actually exists
-            if not frappe.db.exists("DocType", doctype):
+            if doctype not in existing:
                 continue
 
-            # Check if already configured
-            is_configured = False
-            if self.supported_doctypes:
-                is_configured = any(
-                    row.doctype_name == doctype for row in self.supported_doctypes
-                )
-
             available.append(
                 {
                     "doctype": doctype,
@@ -214,7 +242,7 @@ class EmailServiceSettings(Document):
                     "category": info["category"],
                     "default_recipient_field": info["recipient_field"],
                     "default_recipient_doctype": info["recipient_doctype"],
-                    "is_configured": is_configured,
+                    "is_configured": doctype in configured,
                 }
             )
 
@@ -227,6 +255,15 @@ class EmailServiceSettings(Document):
         return self.default_sender_email
 
 
+def _get_existing_doctypes(doctypes):
+    """Return the set of the given doctype names that exist, in one query."""
+    doctypes = [doctype for doctype in doctypes if doctype]
+    if not doctypes:
+        return set()
+
+    return set(frappe.get_all("DocType", filters={"name": ["in", doctypes]}, pluck="name"))
+
+
 @frappe.whitelist()
 def get_available_doctypes_for_site():
     """
@@ -250,7 +287,7 @@ def get_doctype_defaults(doctype):
     try:
         meta = frappe.get_meta(doctype)
         module = meta.module
-        module_app = frappe.db.get_value("Module Def", module, "app_name")
+        module_app = frappe.get_cached_value("Module Def", module, "app_name")
         if module_app:
             source_app = module_app
     except Exception:
@@ -16,11 +16,9 @@ override_whitelisted_methods = {
     "frappe.core.doctype.communication.email.make": "emails.email_service.email_override.make_communication_email"
 }
 
-# Document Events - for webhook status updates
-doc_events = {
-    "Communication": {
-        "on_update": "emails.email_service.email_override.on_communication_update"
-    }
+# Resend send handlers by doctype - other apps can add doctype-specific handlers
+resend_email_handlers = {
+    "__default__": "emails.email_service.generic_email.send_document_email"
 }
 
 # Fixtures - Export Email Service Settings
@@ -10,106 +10,136 @@ hardcoded template ID fields to the new dynamic child table structure.
 
 import frappe
 
+from emails.email_service.utils import clear_email_settings_cache
+
+# Columns of the Email Doctype Configuration rows inserted by execute()
+_CHILD_ROW_FIELDS = (
+    "name",
+    "creation",
+    "modified",
+    "owner",
+    "modified_by",
+    "parent",
+    "parentfield",
+    "parenttype",
+    "idx",
+    "doctype_name",
+    "enabled",
+    "resend_template_id",
+    "recipient_field",
+    "recipient_doctype",
+    "email_field_path",
+    "subject_template",
+    "require_submit",
+    "print_format",
+    "attach_pdf",
+    "source_app",
+)
+
+# Legacy template field, doctype and default recipient configuration
+# (recipient field, recipient doctype, source app) for each migrated doctype
+_LEGACY_MAPPING = (
+    ("invoice_template_id", "Sales Invoice", "customer", "Customer", "erpnext"),
+    ("quotation_template_id", "Quotation", "party_name", "Customer", "erpnext"),
+    ("sales_order_template_id", "Sales Order", "customer", "Customer", "erpnext"),
+    ("delivery_note_template_id", "Delivery Note", "customer", "Customer", "erpnext"),
+    ("receipt_template_id", "Payment Entry", "party", None, "erpnext"),
+    ("purchase_order_template_id", "Purchase Order", "supplier", "Supplier", "erpnext"),
+)
+
 
 def execute():
     """Migrate existing Email Service Settings to new child table structure."""
 
-    # Legacy field to doctype mapping with default configurations
-    legacy_mapping = [
-        {
-            "legacy_field": "invoice_template_id",
-            "doctype_name": "Sales Invoice",
-            "recipient_field": "customer",
-            "recipient_doctype": "Customer",
-            "source_app": "erpnext",
-        },
-        {
-            "legacy_field": "quotation_template_id",
-            "doctype_name": "Quotation",
-            "recipient_field": "party_name",
-            "recipient_doctype": "Customer",
-            "source_app": "erpnext",
-        },
-        {
-            "legacy_field": "sales_order_template_id",
-            "doctype_name": "Sales Order",
-            "recipient_field": "customer",
-            "recipient_doctype": "Customer",
-            "source_app": "erpnext",
-        },
-        {
-            "legacy_field": "delivery_note_template_id",
-            "doctype_name": "Delivery Note",
-            "recipient_field": "customer",
-            "recipient_doctype": "Customer",
-            "source_app": "erpnext",
-        },
-        {
-            "legacy_field": "receipt_template_id",
-            "doctype_name": "Payment Entry",
-            "recipient_field": "party",
-            "recipient_doctype": None,
-            "source_app": "erpnext",
-        },
-        {
-            "legacy_field": "purchase_order_template_id",
-            "doctype_name": "Purchase Order",
-            "recipient_field": "supplier",
-            "recipient_doctype": "Supplier",
-            "source_app": "erpnext",
-        },
-    ]
-
-    try:
-        settings = frappe.get_single("Email Service Settings")
-    except Exception:
-        # Settings don't exist yet, nothing to migrate
+    # Nothing to migrate into on a partial install
+    if not frappe.db.exists("DocType", "Email Doctype Configuration"):
         return
 
     # Skip if already migrated (child table has entries)
-    if settings.supported_doctypes and len(settings.supported_doctypes) > 0:
-        frappe.log_error(
-            title="Email Settings Migration Skipped",
-            message="Child table already has entries, skipping migration.",
+    if frappe.db.exists(
+        "Email Doctype Configuration",
+        {"parenttype": "Email Service Settings", "parentfield": "supported_doctypes"},
+    ):
+        frappe.logger("emails").info(
+            "Email Settings Migration Skipped: child table already has entries"
         )
         return
 
-    migrated_count = 0
+    # All legacy template IDs in one read. Straight from tabSingles, so values
+    # of legacy fields since dropped from the doctype are still migrated.
+    template_ids = dict(
+        frappe.db.sql(
+            """
+            select field, value from `tabSingles`
+            where doctype = 'Email Service Settings' and field in %s
+            """,
+            (tuple(mapping[0] for mapping in _LEGACY_MAPPING),),
+        )
+    )
 
-    for config in legacy_mapping:
-        legacy_field = config["legacy_field"]
-        doctype_name = config["doctype_name"]
+    # Nothing to migrate unless some legacy template ID is set
+    if not any(template_ids.values()):
+        return
 
+    # Doctypes installed on this site, in one query
+    existing = set(
+        frappe.get_all(
+            "DocType",
+            filters={"name": ["in", [mapping[1] for mapping in _LEGACY_MAPPING]]},
+            pluck="name",
+        )
+    )
+
+    now = frappe.utils.now()
+    user = frappe.session.user
+    rows = []
+
+    for legacy_field, doctype_name, recipient_field, recipient_doctype, source_app in _LEGACY_MAPPING:
         # Get template ID from legacy field
-        template_id = getattr(settings, legacy_field, None)
+        template_id = template_ids.get(legacy_field)
 
         # Only migrate if the doctype exists in this installation
-        if not frappe.db.exists("DocType", doctype_name):
+        if doctype_name not in existing:
             continue
 
-        # Create child table entry
-        settings.append(
-            "supported_doctypes",
-            {
-                "doctype_name": doctype_name,
-                "enabled": 1,
-                "resend_template_id": template_id or "",
-                "recipient_field": config["recipient_field"],
-                "recipient_doctype": config["recipient_doctype"],
-                "email_field_path": "",
-                "subject_template": "",
-                "require_submit": 1,
-                "print_format": None,
-                "source_app": config["source_app"],
-            },
+        # Child table row, written directly so the rows go in with one INSERT
+        rows.append(
+            (
+                frappe.generate_hash(length=10),
+                now,
+                now,
+                user,
+                user,
+                "Email Service Settings",
+                "supported_doctypes",
+                "Email Service Settings",
+                len(rows) + 1,
+                doctype_name,
+                1,
+                template_id or "",
+                recipient_field,
+                recipient_doctype,
+                "",
+                "",
+                1,
+                None,
+                1,
+                source_app,
+            )
         )
-        migrated_count += 1
 
-    if migrated_count > 0:
-        settings.save(ignore_permissions=True)
-        frappe.db.commit()
+    if rows:
+        frappe.db.bulk_insert(
+            "Email Doctype Configuration",
+            _CHILD_ROW_FIELDS,
+            rows,
+            chunk_size=100,
+        )
+        # The settings controller didn't run, so drop its cached copies here.
+        # The patch runner commits once the patch returns.
+        clear_email_settings_cache()
 
-        frappe.log_error(
-            title="Email Settings Migration Complete",
-            message=f"Migrated {migrated_count} doctype configurations to child table.",
+        frappe.logger("emails").info(
+            "Email Settings Migration Complete: migrated %d doctype configurations",
+            len(rows),
         )
@@ -171,24 +171,74 @@ emails.send_document_email = function(frm, values) {
         freeze: true,
         freeze_message: __("Sending email..."),
         callback: function(r) {
-            if (r.message && r.message.success) {
+            if (r.message && r.message.success && r.message.queued) {
                 frappe.show_alert({
-                    message: __("Email sent successfully"),
-                    indicator: "green"
+                    message: __("Email queued for sending"),
+                    indicator: "blue"
                 });
-                // Reload to show new communication in timeline and update button
-                frm.reload_doc();
+                emails.poll_send_status(frm, r.message.job_id);
+            } else if (r.message && r.message.success) {
+                emails.show_email_sent(frm);
             } else {
-                frappe.msgprint({
-                    title: __("Email Failed"),
-                    message: r.message ? r.message.message : __("Unknown error"),
-                    indicator: "red"
-                });
+                emails.show_email_failed(r.message ? r.message.message : __("Unknown error"));
             }
         }
     });
 };
 
+emails.SEND_STATUS_POLL_INTERVAL = 2000;
+emails.SEND_STATUS_MAX_POLLS = 60;
+
+emails.poll_send_status = function(frm, job_id, attempt) {
+    // Follow a queued send until its background job finishes
+    attempt = attempt || 0;
+    if (!job_id || attempt >= emails.SEND_STATUS_MAX_POLLS) {
+        return;
+    }
+
+    setTimeout(function() {
+        frappe.call({
+            method: "emails.api.get_send_status",
+            args: {
+                job_id: job_id
+            },
+            callback: function(r) {
+                let status = r.message ? r.message.status : "UNKNOWN";
+
+                if (status === "SUCCESS") {
+                    let result = r.message.result || {};
+                    if (result.success === false) {
+                        emails.show_email_failed(result.message);
+                    } else {
+                        emails.show_email_sent(frm);
+                    }
+                } else if (status === "FAILURE") {
+                    emails.show_email_failed(r.message.message);
+                } else if (status === "PENDING" || status === "RUNNING") {
+                    emails.poll_send_status(frm, job_id, attempt + 1);
+                }
+            }
+        });
+    }, emails.SEND_STATUS_POLL_INTERVAL);
+};
+
+emails.show_email_sent = function(frm) {
+    frappe.show_alert({
+        message: __("Email sent successfully"),
+        indicator: "green"
+    });
+    // Reload to show new communication in timeline and update button
+    frm.reload_doc();
+};
+
+emails.show_email_failed = function(message) {
+    frappe.msgprint({
+        title: __("Email Failed"),
+        message: message || __("Unknown error"),
+        indicator: "red"
+    });
+};
+
 // Setup form hooks for all supported doctypes
 $(document).ready(function() {
     emails.SUPPORTED_DOCTYPES.forEach(function(doctype) {